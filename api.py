@@ -0,0 +1,260 @@
+import json
+import threading
+import time
+from flask import Blueprint, Response, current_app, request, jsonify, abort, stream_with_context, url_for
+from werkzeug.exceptions import HTTPException
+from sqlalchemy.orm import selectinload
+from models import db, Producto, Categoria, Lote, Venta
+from queries import paginar
+from cambios import cambios_desde, como_dict, ultimo_id, LIMITE as LIMITE_CAMBIOS
+
+api = Blueprint("api", __name__, url_prefix="/api/v1")
+
+POR_PAGINA = 100
+MAX_POR_PAGINA = 500
+MAX_IDS = 200
+
+
+def _fecha(valor):
+    return valor.isoformat() if valor else None
+
+
+# Recurso -> modelo, campos serializables y relaciones que hay que cargar
+# solo si el cliente pide el campo (así ?campos=id,cantidad no toca otras tablas).
+RECURSOS = {
+    "productos": {
+        "modelo": Producto,
+        "campos": {
+            "id": lambda p: p.id,
+            "nombre": lambda p: p.nombre,
+            "cantidad": lambda p: p.cantidad,
+            "precio_compra": lambda p: p.precio_compra,
+            "costo_envio_unitario": lambda p: p.costo_envio_unitario,
+            "costo_extra": lambda p: p.costo_extra,
+            "margen": lambda p: p.margen,
+            "precio_sugerido": lambda p: p.precio_sugerido,
+            "lote_id": lambda p: p.lote_id,
+            "categorias": lambda p: [c.id for c in p.categorias],
+            "fotos": lambda p: [url_for("uploaded_file", filename=f.ruta) for f in p.fotos],
+        },
+        "relaciones": {
+            "categorias": selectinload(Producto.categorias),
+            "fotos": selectinload(Producto.fotos),
+        },
+    },
+    "categorias": {
+        "modelo": Categoria,
+        "campos": {
+            "id": lambda c: c.id,
+            "nombre": lambda c: c.nombre,
+            "productos": lambda c: [p.id for p in c.productos],
+        },
+        "relaciones": {"productos": selectinload(Categoria.productos)},
+    },
+    "lotes": {
+        "modelo": Lote,
+        "campos": {
+            "id": lambda l: l.id,
+            "fecha": lambda l: _fecha(l.fecha),
+            "costo_envio": lambda l: l.costo_envio,
+            "productos": lambda l: [p.id for p in l.productos],
+        },
+        "relaciones": {"productos": selectinload(Lote.productos)},
+    },
+    "ventas": {
+        "modelo": Venta,
+        "campos": {
+            "id": lambda v: v.id,
+            "fecha": lambda v: _fecha(v.fecha),
+            "producto_id": lambda v: v.producto_id,
+            "producto_nombre": lambda v: v.producto_nombre,
+            "cantidad": lambda v: v.cantidad,
+            "precio_venta": lambda v: v.precio_venta,
+        },
+        "relaciones": {},
+    },
+}
+
+
+@api.errorhandler(HTTPException)
+def error_json(e):
+    return jsonify({"error": e.description}), e.code
+
+
+def _campos(recurso):
+    """Campos pedidos en ?campos=a,b,c (todos si no se indica)."""
+    disponibles = recurso["campos"]
+    pedidos = request.args.get("campos")
+    if not pedidos:
+        return list(disponibles)
+    campos = [c.strip() for c in pedidos.split(",") if c.strip()]
+    desconocidos = [c for c in campos if c not in disponibles]
+    if desconocidos:
+        abort(400, f"Campos desconocidos: {', '.join(desconocidos)}")
+    return campos
+
+
+def _ids():
+    try:
+        ids = [int(i) for i in request.args["ids"].split(",") if i.strip()]
+    except ValueError:
+        abort(400, "ids debe ser una lista de enteros separados por coma")
+    if len(ids) > MAX_IDS:
+        abort(400, f"Como máximo {MAX_IDS} ids por pedido")
+    return ids
+
+
+def _serializar(filas, recurso, campos):
+    serializadores = [(c, recurso["campos"][c]) for c in campos]
+    return [{c: f(fila) for c, f in serializadores} for fila in filas]
+
+
+def _responder(cuerpo):
+    """JSON con ETag: si el cliente ya tiene esta versión recibe 304 sin cuerpo."""
+    respuesta = jsonify(cuerpo)
+    respuesta.add_etag()
+    respuesta.cache_control.no_cache = True
+    return respuesta.make_conditional(request)
+
+
+def _query(recurso, campos):
+    modelo = recurso["modelo"]
+    opciones = [carga for campo, carga in recurso["relaciones"].items() if campo in campos]
+    return modelo.query.options(*opciones)
+
+
+# -------------------- CAMBIOS DE STOCK --------------------
+# Para sincronizar: 1) GET /cambios sin ?desde= para obtener el cursor actual,
+# 2) bajar /productos completo, 3) pedir /cambios?desde=<cursor> de ahí en más.
+# Cada cambio trae el estado completo del producto, así que repetir alguno
+# (por el solapamiento entre 1 y 2) no hace daño.
+class Cupos:
+    """Cuenta los streams abiertos en este proceso."""
+
+    def __init__(self):
+        self.activos = 0
+        self._lock = threading.Lock()
+
+    def tomar(self, maximo):
+        with self._lock:
+            if self.activos >= maximo:
+                return False
+            self.activos += 1
+            return True
+
+    def soltar(self):
+        with self._lock:
+            self.activos -= 1
+
+
+streams = Cupos()
+
+
+def _desde(valor):
+    try:
+        desde = int(valor)
+    except (TypeError, ValueError):
+        abort(400, "desde debe ser el id del último cambio recibido")
+    if desde < 0:
+        abort(400, "desde debe ser el id del último cambio recibido")
+    return desde
+
+
+@api.route("/cambios")
+def cambios():
+    """Cambios posteriores a ?desde= (como mucho ?limite=, por defecto 500)."""
+    if "desde" not in request.args:
+        return _responder({"datos": [], "cursor": ultimo_id(), "hay_mas": False})
+    desde = _desde(request.args["desde"])
+    limite = request.args.get("limite", LIMITE_CAMBIOS, type=int)
+    if not 1 <= limite <= LIMITE_CAMBIOS:
+        abort(400, f"limite debe estar entre 1 y {LIMITE_CAMBIOS}")
+    filas = cambios_desde(desde, limite + 1)
+    datos = [como_dict(c) for c in filas[:limite]]
+    return _responder({
+        "datos": datos,
+        "cursor": datos[-1]["id"] if datos else desde,
+        "hay_mas": len(filas) > limite,
+    })
+
+
+@api.route("/cambios/stream")
+def cambios_stream():
+    """Server-sent events con cada cambio; reanuda desde Last-Event-ID o ?desde=.
+
+    Cada stream abierto ocupa un hilo del worker mientras dura, así que hay
+    como mucho CAMBIOS_SSE_MAX por proceso (menos que los --threads de
+    gunicorn, para que siempre queden hilos para el resto de la app); pasado
+    ese número se responde 503 y el consumidor debe usar GET /cambios. La
+    conexión se cierra sola cada CAMBIOS_SSE_DURACION segundos; EventSource
+    se reconecta y manda Last-Event-ID, así que no se pierde nada.
+    """
+    inicial = request.headers.get("Last-Event-ID") or request.args.get("desde")
+    desde = ultimo_id() if inicial is None else _desde(inicial)
+    if not streams.tomar(current_app.config["CAMBIOS_SSE_MAX"]):
+        respuesta = jsonify({"error": "Demasiados streams abiertos: usar GET /api/v1/cambios?desde="})
+        respuesta.status_code = 503
+        respuesta.headers["Retry-After"] = str(current_app.config["CAMBIOS_SSE_DURACION"])
+        return respuesta
+    intervalo = current_app.config["CAMBIOS_SSE_INTERVALO"]
+    duracion = current_app.config["CAMBIOS_SSE_DURACION"]
+
+    def eventos(ultimo):
+        fin = time.monotonic() + duracion
+        latido = time.monotonic()
+        yield "retry: 3000\n\n"
+        while time.monotonic() < fin:
+            nuevos = [como_dict(c) for c in cambios_desde(ultimo)]
+            db.session.rollback()  # no retener la conexión ni la instantánea entre vueltas
+            for cambio in nuevos:
+                ultimo = cambio["id"]
+                yield f"id: {ultimo}\nevent: cambio\ndata: {json.dumps(cambio)}\n\n"
+            if nuevos:
+                latido = time.monotonic()
+                continue  # puede haber más: seguir sin esperar
+            if time.monotonic() - latido > 15:
+                latido = time.monotonic()
+                yield ": ping\n\n"  # que los proxies no corten la conexión
+            time.sleep(intervalo)
+
+    respuesta = Response(stream_with_context(eventos(desde)), mimetype="text/event-stream",
+                         headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+    respuesta.call_on_close(streams.soltar)
+    return respuesta
+
+
+# -------------------- RECURSOS --------------------
+@api.route("/<nombre>")
+def listar(nombre):
+    """Listado paginado por id (?cursor=, ?limite=) o lote de ids (?ids=1,2,3)."""
+    recurso = RECURSOS.get(nombre) or abort(404, f"Recurso desconocido: {nombre}")
+    campos = _campos(recurso)
+    modelo = recurso["modelo"]
+    query = _query(recurso, campos)
+
+    if "ids" in request.args:
+        ids = _ids()
+        encontrados = {fila.id: fila for fila in query.filter(modelo.id.in_(ids))} if ids else {}
+        return _responder({
+            "datos": _serializar([encontrados[i] for i in ids if i in encontrados], recurso, campos),
+            "faltantes": [i for i in ids if i not in encontrados],
+        })
+
+    limite = request.args.get("limite", POR_PAGINA, type=int)
+    if not 1 <= limite <= MAX_POR_PAGINA:
+        abort(400, f"limite debe estar entre 1 y {MAX_POR_PAGINA}")
+    try:
+        filas, siguiente = paginar(query, (modelo.id,), request.args.get("cursor"), por_pagina=limite)
+    except ValueError:
+        abort(400, "Cursor inválido")
+    return _responder({"datos": _serializar(filas, recurso, campos), "siguiente": siguiente})
+
+
+@api.route("/<nombre>/<int:id>")
+def ver(nombre, id):
+    recurso = RECURSOS.get(nombre) or abort(404, f"Recurso desconocido: {nombre}")
+    campos = _campos(recurso)
+    fila = _query(recurso, campos).filter(recurso["modelo"].id == id).first()
+    if fila is None:
+        abort(404, f"No existe {nombre}/{id}")
+    return _responder(_serializar([fila], recurso, campos)[0])
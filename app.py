@@ -1,61 +1,325 @@
 import os
-from flask import Flask, render_template, request, redirect, url_for, flash, send_from_directory
-from werkzeug.utils import secure_filename
-from models import db, Producto, Categoria, Lote, FotoProducto, Venta
-from datetime import datetime
+import time
+import click
+from flask import Flask, render_template, request, redirect, url_for, flash, send_from_directory, abort, Response, stream_with_context, make_response, session, jsonify
+from database import configuracion_db, configurar_motor, migrar, copiar_datos
+from models import db, producto_categoria, Producto, Categoria, Lote, FotoProducto
+from jobs import tarea, encolar, iniciar_workers, procesar_pendientes, recuperar_abandonados, purgar as purgar_trabajos
+from queries import productos_listado, productos_catalogo, lotes_listado, ventas_historial, paginar, CLAVE_PRODUCTOS, CLAVE_VENTAS, CLAVE_LOTES
+from cache import cache_catalogo
+from images import generar_variantes, ruta_variante, VARIANTES
+from blobs import guardar_blob, soltar_blob, borrar_si_huerfano, es_blob, deduplicar
+from export import csv_stream, json_stream, filas_stock, filas_ventas, STOCK_COLUMNAS, VENTAS_COLUMNAS, EXPORTACIONES
+from importer import importar, formato_de, ENTIDADES
+from stats import MESES, resumen_dashboard, ventas_mensuales, reconstruir_resumenes
+from search import buscar_productos, reconstruir_indice
+from orders import registrar_pedido, StockInsuficiente, LineaInvalida, ProductoNoEncontrado
+from api import api
+from cambios import registrar_cambios, purgar as purgar_cambios
+from precios import repreciar_lote, verificar_precios
+from bajas import eliminar_productos, eliminar_lote, eliminar_categoria as borrar_categoria
+from reportes import calcular_reporte, REPORTES, DIAS_VELOCIDAD
+from datos_prueba import generar as generar_datos, ESCALAS
+from instrumentacion import configurar_instrumentacion
+from datetime import datetime, timedelta
 
 BASE_DIR = os.path.abspath(os.path.dirname(__file__))
 UPLOAD_FOLDER = os.path.join("static", "uploads")
 ALLOWED_EXT = {"png","jpg","jpeg","gif"}
 
 app = Flask(__name__)
-app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///" + os.path.join(BASE_DIR, "stock.db")
+app.config.update(configuracion_db(BASE_DIR))
 app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
-app.config["UPLOAD_FOLDER"] = UPLOAD_FOLDER
+app.config["UPLOAD_FOLDER"] = os.environ.get("UPLOAD_FOLDER", UPLOAD_FOLDER)  # relativa a BASE_DIR o absoluta
+app.config["CATALOGO_CACHE_SIZE"] = int(os.environ.get("CATALOGO_CACHE_SIZE", 128))  # páginas del catálogo en memoria; 0 = sin caché
+app.config["CATALOGO_CACHE_TTL"] = int(os.environ.get("CATALOGO_CACHE_TTL", 300))    # segundos
+app.config["UPLOADS_MAX_AGE"] = 365 * 24 * 3600  # fotos con nombre por contenido
+app.config["CAMBIOS_SSE_INTERVALO"] = 1    # segundos entre consultas del stream de cambios
+app.config["CAMBIOS_SSE_DURACION"] = 300  # el cliente se reconecta con Last-Event-ID
+app.config["CAMBIOS_SSE_MAX"] = int(os.environ.get("CAMBIOS_SSE_MAX", 2))  # streams por worker; menos que --threads
+app.config["REPORTE_FILAS_HTML"] = 100    # productos en /reportes (el CSV trae todos)
+app.config["TRABAJOS_HILOS"] = int(os.environ.get("TRABAJOS_HILOS", 1))  # 0 = usar `flask trabajos`
 app.secret_key = "supersecreto"
 
 db.init_app(app)
+configurar_motor(app)
+configurar_instrumentacion(app)  # solo con INSTRUMENTACION=1
+cache_catalogo.configurar(app.config["CATALOGO_CACHE_SIZE"], app.config["CATALOGO_CACHE_TTL"])
+app.register_blueprint(api)  # API JSON en /api/v1
 
 # -------------------- UTILIDADES --------------------
 with app.app_context():
-    os.makedirs(os.path.join(BASE_DIR, UPLOAD_FOLDER), exist_ok=True)
-    db.create_all()
+    os.makedirs(os.path.join(BASE_DIR, app.config["UPLOAD_FOLDER"]), exist_ok=True)
+    migrar()  # también crea las tablas; con varios workers migra uno solo
+
+@app.cli.command("migrar")
+def migrar_cmd():
+    """Aplica las migraciones de esquema pendientes."""
+    nuevas = migrar()
+    print("Migraciones aplicadas: " + (", ".join(nuevas) if nuevas else "ninguna"))
+
+@app.cli.command("copiar-datos")
+@click.argument("destino")
+@click.option("--origen", default=None, help="URI de origen (por defecto, la base actual).")
+def copiar_datos_cmd(destino, origen):
+    """Copia todos los datos a otra base, p. ej. postgresql://usuario@host/stock."""
+    copiar_datos(origen or app.config["SQLALCHEMY_DATABASE_URI"], destino)
+    print("✅ Copia terminada")
+
+@app.cli.command("rebuild-resumenes")
+def rebuild_resumenes():
+    """Recalcula desde cero los acumulados de ventas."""
+    filas = reconstruir_resumenes()
+    print(f"Acumulados recalculados: {filas} filas")
+
+@app.cli.command("reindexar-busqueda")
+def reindexar_busqueda():
+    """Reconstruye el índice de búsqueda de productos."""
+    reconstruir_indice()
+    db.session.commit()
+    print("Índice de búsqueda reconstruido")
+
+@app.cli.command("purgar-cambios")
+@click.option("--dias", default=30, show_default=True, help="Conservar los cambios de los últimos N días.")
+def purgar_cambios_cmd(dias):
+    """Borra el registro de cambios de stock más viejo que --dias."""
+    print(f"Cambios borrados: {purgar_cambios(dias)}")
+
+@app.cli.command("verificar-precios")
+@click.option("--corregir", is_flag=True, help="Recalcular los que no coinciden.")
+def verificar_precios_cmd(corregir):
+    """Compara el costo y precio guardados de cada producto con el calculado."""
+    inconsistentes = verificar_precios(corregir)
+    if not inconsistentes:
+        print("✅ Costos y precios consistentes")
+        return
+    print(f"{'Corregidos' if corregir else 'Inconsistentes'}: {len(inconsistentes)} productos")
+    print(", ".join(map(str, inconsistentes[:50])) + (" ..." if len(inconsistentes) > 50 else ""))
+    if not corregir:
+        raise SystemExit(1)
+
+@app.cli.command("generar-datos")
+@click.option("--escala", type=click.Choice(sorted(ESCALAS)), default="chica", show_default=True)
+@click.option("--lotes", type=int, help="Sobrescribe el valor de la escala.")
+@click.option("--productos", type=int)
+@click.option("--categorias", type=int)
+@click.option("--ventas", type=int)
+@click.option("--fotos", type=int, help="Fotos por producto (0 a 4).")
+@click.option("--semilla", type=int, default=1, show_default=True)
+@click.option("--si", is_flag=True, help="No pedir confirmación.")
+def generar_datos_cmd(escala, semilla, si, **cantidades):
+    """Agrega datos sintéticos a la base actual (para pruebas de carga)."""
+    valores = {**ESCALAS[escala], **{k: v for k, v in cantidades.items() if v is not None}}
+    if not si:
+        click.confirm(f"Se agregan {valores} a {app.config['SQLALCHEMY_DATABASE_URI']}. ¿Seguir?", abort=True)
+    t0 = time.perf_counter()
+    creados = generar_datos(**valores, carpeta_fotos=carpeta_uploads(), semilla=semilla)
+    print(f"✅ Generado en {time.perf_counter() - t0:.1f}s: {creados}")
+
+@app.cli.command("generar-variantes")
+@click.option("--forzar", is_flag=True, help="Regenerar aunque ya existan.")
+def generar_variantes_cmd(forzar):
+    """Genera miniaturas para las fotos que ya están en disco."""
+    generadas = errores = 0
+    for foto in FotoProducto.query.order_by(FotoProducto.id).yield_per(200):
+        try:
+            generadas += generar_variantes(carpeta_uploads(), foto.ruta, forzar=forzar)
+        except Exception as e:
+            errores += 1
+            print(f"❌ {foto.ruta}: {e}")
+    print(f"Variantes generadas: {generadas} (errores: {errores})")
+
+@app.cli.command("trabajos")
+@click.option("--una-vez", is_flag=True, help="Procesar lo pendiente y salir.")
+def trabajos_cmd(una_vez):
+    """Consume la cola de trabajos en primer plano."""
+    recuperar_abandonados()
+    if una_vez:
+        print(f"Trabajos procesados: {procesar_pendientes()}")
+        return
+    iniciar_workers(app, max(app.config["TRABAJOS_HILOS"], 1))
+    while True:
+        time.sleep(60)
+
+@app.cli.command("purgar-trabajos")
+@click.option("--dias", default=7, show_default=True, help="Conservar los terminados en los últimos N días.")
+@click.option("--con-errores", is_flag=True, help="Borrar también los que fallaron.")
+def purgar_trabajos_cmd(dias, con_errores):
+    """Borra de la cola los trabajos terminados más viejos que --dias."""
+    print(f"Trabajos borrados: {purgar_trabajos(dias, con_errores)}")
+
+@app.cli.command("deduplicar-uploads")
+@click.option("--simular", is_flag=True, help="Mostrar qué se haría sin tocar nada.")
+def deduplicar_uploads_cmd(simular):
+    """Renombra las fotos existentes por contenido y unifica las copias."""
+    resultado = deduplicar(carpeta_uploads(), simular=simular)
+    for clave, valor in resultado.items():
+        print(f"{clave}: {valor}")
+    if not simular:
+        for ruta in {f.ruta for f in FotoProducto.query}:
+            encolar("variantes", ruta=ruta)
+        db.session.commit()
+        cache_catalogo.invalidar()
+
+@app.cli.command("importar")
+@click.argument("entidad", type=click.Choice(ENTIDADES))
+@click.argument("archivo", type=click.Path(exists=True, dir_okay=False))
+@click.option("--estricto", is_flag=True, help="Cancelar todo si alguna fila tiene errores.")
+def importar_cmd(entidad, archivo, estricto):
+    """Importa lotes, productos o ventas desde un CSV o JSON."""
+    inicio = time.perf_counter()
+    with open(archivo, "rb") as f:
+        resultado = importar(entidad, f, formato_de(archivo), estricto=estricto)
+    cache_catalogo.invalidar()
+    for linea, mensaje in resultado["detalle_errores"]:
+        print(f"❌ línea {linea}: {mensaje}")
+    print(f"Importadas: {resultado['importadas']} - errores: {resultado['errores']} - "
+          f"categorías nuevas: {resultado['categorias_creadas']} ({time.perf_counter() - inicio:.1f}s)")
+
+@app.cli.command("exportar")
+@click.argument("entidad", type=click.Choice(sorted(EXPORTACIONES)))
+@click.option("--formato", type=click.Choice(["csv", "json"]), default="csv")
+@click.option("--salida", type=click.File("w", encoding="utf-8"), default="-")
+def exportar_cmd(entidad, formato, salida):
+    """Exporta una entidad completa a CSV o JSON Lines."""
+    columnas, filas = EXPORTACIONES[entidad]
+    stream = csv_stream if formato == "csv" else json_stream
+    for parte in stream(columnas, filas()):
+        salida.write(parte)
+
+@app.before_request
+def arrancar_workers():
+    iniciar_workers(app, app.config["TRABAJOS_HILOS"])
 
 def allowed_file(filename):
     return "." in filename and filename.rsplit(".",1)[1].lower() in ALLOWED_EXT
 
+def carpeta_uploads():
+    return os.path.join(BASE_DIR, app.config["UPLOAD_FOLDER"])
+
+def guardar_foto(file):
+    """Guarda la foto en el almacén por contenido y devuelve su ruta.
+
+    Las miniaturas se generan después, en la cola de trabajos.
+    """
+    ruta = guardar_blob(carpeta_uploads(), file.stream, file.filename)
+    encolar("variantes", ruta=ruta)
+    return ruta
+
+def soltar_foto(foto):
+    """Resta la referencia al archivo y agenda su borrado si quedó sin uso."""
+    if soltar_blob(foto.ruta):
+        encolar("borrar_foto", ruta=foto.ruta)
+
+@tarea("variantes")
+def tarea_variantes(ruta):
+    if os.path.exists(os.path.join(carpeta_uploads(), ruta)):
+        generar_variantes(carpeta_uploads(), ruta)
+
+@tarea("borrar_foto")
+def tarea_borrar_foto(ruta):
+    borrar_si_huerfano(carpeta_uploads(), ruta)
+
+@tarea("borrar_fotos")
+def tarea_borrar_fotos(rutas):
+    for ruta in rutas:
+        borrar_si_huerfano(carpeta_uploads(), ruta)
+
+@app.template_global()
+def foto_url(ruta, variante=None):
+    """URL de la variante pedida, o del original si todavía no existe."""
+    if variante and os.path.exists(os.path.join(carpeta_uploads(), ruta_variante(ruta, variante))):
+        ruta = ruta_variante(ruta, variante)
+    return url_for("uploaded_file", filename=ruta)
+
+@app.template_global()
+def foto_srcset(ruta):
+    return ", ".join(f"{foto_url(ruta, v)} {ancho}w" for v, ancho in VARIANTES.items())
+
+def confirmar_pedido(lineas):
+    """Registra y confirma las ventas; devuelve el error (la excepción) o None."""
+    try:
+        agotados = registrar_pedido(lineas)
+    except (StockInsuficiente, LineaInvalida) as e:
+        db.session.rollback()
+        return e
+    db.session.commit()
+    if agotados:
+        cache_catalogo.invalidar(categorias_de(*[db.session.get(Producto, pid) for pid in agotados]))
+    return None
+
+def estado_pedido(error):
+    """Código HTTP de un pedido rechazado: 409 solo si faltó stock."""
+    if isinstance(error, StockInsuficiente):
+        return 409
+    if isinstance(error, ProductoNoEncontrado):
+        return 404
+    return 400
+
+def categorias_de(*productos):
+    """Ids de categoría de los productos (para invalidar el catálogo)."""
+    return {c.id for p in productos for c in p.categorias}
+
+def categorias_de_lote(lote_id):
+    """Ids de categoría de los productos del lote, en una sola consulta."""
+    return set(db.session.scalars(
+        db.select(producto_categoria.c.categoria_id).distinct()
+        .join(Producto, Producto.id == producto_categoria.c.producto_id)
+        .where(Producto.lote_id == lote_id)))
+
+def pagina(query, columnas, descendente=False):
+    """Filas de la página pedida en ?cursor= y los enlaces de navegación."""
+    cursor = request.args.get("cursor")
+    try:
+        filas, siguiente = paginar(query, columnas, cursor, descendente=descendente)
+    except ValueError:
+        abort(400)
+    args = request.args.to_dict()
+    args.pop("cursor", None)
+    paginacion = {
+        "primera": url_for(request.endpoint, **args) if cursor else None,
+        "siguiente": url_for(request.endpoint, **args, cursor=siguiente) if siguiente else None,
+    }
+    return filas, paginacion
+
+def exportar_csv(nombre_archivo, encabezado, filas):
+    return Response(stream_with_context(csv_stream(encabezado, filas)),
+                    mimetype="text/csv",
+                    headers={"Content-Disposition": f"attachment; filename={nombre_archivo}"})
+
+def exportar_json(nombre_archivo, encabezado, filas):
+    return Response(stream_with_context(json_stream(encabezado, filas)),
+                    mimetype="application/x-ndjson",
+                    headers={"Content-Disposition": f"attachment; filename={nombre_archivo}"})
+
+def parse_fecha(valor):
+    return datetime.strptime(valor, "%Y-%m-%d")
+
 @app.route("/dashboard")
 def dashboard():
-    total_ventas = db.session.query(db.func.sum(Venta.cantidad)).scalar() or 0
-    total_stock = db.session.query(db.func.sum(Producto.cantidad)).scalar() or 0
-    total_lotes = Lote.query.count()
-    ganancias = 0
-    for v in Venta.query.all():
-        if v.producto:
-            costo_unitario = (
-                (v.producto.precio_compra or 0) +
-                (v.producto.costo_envio_unitario or 0) +
-                (v.producto.costo_extra or 0)
-            )
-            ganancias += (v.precio_venta - costo_unitario) * v.cantidad
-
-    ganancia_estimada = round(ganancias, 2)
-
-    meses = ["Ene","Feb","Mar","Abr","May","Jun","Jul","Ago","Sep","Oct","Nov","Dic"]
-    ventas_mensuales = [0]*12
-    for v in Venta.query.all():
-        ventas_mensuales[v.fecha.month-1] += v.cantidad
+    # filtros opcionales: ?anio=2025 o ?desde=2025-01-01&hasta=2025-06-30
+    anio = request.args.get("anio", type=int)
+    desde = request.args.get("desde", type=parse_fecha)
+    hasta = request.args.get("hasta", type=parse_fecha)
+    if anio:
+        desde, hasta = datetime(anio, 1, 1), datetime(anio + 1, 1, 1)
+    elif hasta:
+        hasta += timedelta(days=1)  # incluir el día completo
+
+    resumen = resumen_dashboard(desde, hasta)
+    anio_grafico = anio or (desde.year if desde else datetime.utcnow().year)
+    mensuales = ventas_mensuales(anio_grafico, desde, hasta)
 
     productos_stock = Producto.query.order_by(Producto.cantidad.desc()).limit(6).all()
 
     return render_template("dashboard.html",
-                           total_ventas=total_ventas,
-                           total_stock=total_stock,
-                           total_lotes=total_lotes,
-                           ganancia_estimada=ganancia_estimada,
-                           meses=meses,
-                           ventas_mensuales=ventas_mensuales,
-                           productos_stock=productos_stock)
+                           meses=MESES,
+                           ventas_mensuales=mensuales,
+                           productos_stock=productos_stock,
+                           anio=anio_grafico,
+                           desde=request.args.get("desde", ""),
+                           hasta=request.args.get("hasta", ""),
+                           **resumen)
 
 @app.route("/")
 def index():
@@ -64,8 +328,8 @@ def index():
 # ---------- LOTES ----------
 @app.route("/lotes")
 def lotes():
-    lotes = Lote.query.order_by(Lote.fecha.desc()).all()
-    return render_template("lotes.html", lotes=lotes)
+    lotes, paginacion = pagina(lotes_listado(), CLAVE_LOTES, descendente=True)
+    return render_template("lotes.html", lotes=lotes, paginacion=paginacion)
 
 @app.route("/lotes/add", methods=["GET", "POST"])
 def add_lote():
@@ -83,36 +347,32 @@ def edit_lote(lote_id):
     lote = Lote.query.get_or_404(lote_id)
 
     if request.method == "POST":
-        lote.costo_envio = float(request.form.get("costo_envio", 0))
+        lote.costo_envio = float(request.form.get("costo_envio", 0) or 0)
+        margen = request.form.get("margen", "").strip()
+        # reparte el envío entre las unidades del lote y recalcula precios en un UPDATE
+        ids = repreciar_lote(lote.id, lote.costo_envio, float(margen) if margen else None)
+        registrar_cambios(ids, "modificacion")
         db.session.commit()
-        flash("✅ Lote actualizado", "success")
+        cache_catalogo.invalidar(categorias_de_lote(lote.id))
+        flash(f"✅ Lote actualizado ({len(ids)} productos repreciados)", "success")
         return redirect(url_for("lotes"))
 
     return render_template("edit_lote.html", lote=lote)
 
 @app.route("/lote/<int:lote_id>/eliminar", methods=["POST"])
 def delete_lote(lote_id):
-    lote = Lote.query.get_or_404(lote_id)
-    for p in lote.productos:
-        for f in list(p.fotos):
-            try:
-                path = os.path.join(BASE_DIR, app.config["UPLOAD_FOLDER"], f.ruta)
-                if os.path.exists(path):
-                    os.remove(path)
-            except Exception:
-                pass
-            db.session.delete(f)
-        db.session.delete(p)
-    db.session.delete(lote)
+    Lote.query.get_or_404(lote_id)
+    afectadas = eliminar_lote(lote_id)
     db.session.commit()
+    cache_catalogo.invalidar(afectadas)
     flash("🗑️ Lote y productos eliminados", "success")
     return redirect(url_for("lotes"))
 
 # ---------- PRODUCTOS ----------
 @app.route("/productos")
 def productos():
-    productos = Producto.query.order_by(Producto.nombre).all()
-    return render_template("productos.html", productos=productos)
+    productos, paginacion = pagina(productos_listado(), CLAVE_PRODUCTOS)
+    return render_template("productos.html", productos=productos, paginacion=paginacion)
 
 @app.route("/producto/nuevo", methods=["GET","POST"])
 def nuevo_producto():
@@ -146,6 +406,8 @@ def nuevo_producto():
                 producto.categorias.append(cat)
 
         db.session.add(producto)
+        db.session.flush()
+        registrar_cambios([producto.id], "alta")
         db.session.commit()
 
         files = request.files.getlist("fotos")
@@ -154,18 +416,10 @@ def nuevo_producto():
         else:
             for file in files[:4]:
                 if file and file.filename and allowed_file(file.filename):
-                    filename = secure_filename(file.filename)
-                    filepath = os.path.join(app.config["UPLOAD_FOLDER"], filename)
-                    base, ext = os.path.splitext(filename)
-                    counter = 1
-                    while os.path.exists(os.path.join(BASE_DIR, filepath)):
-                        filename = f"{base}_{counter}{ext}"
-                        filepath = os.path.join(app.config["UPLOAD_FOLDER"], filename)
-                        counter += 1
-                    file.save(os.path.join(BASE_DIR, filepath))
-                    foto = FotoProducto(ruta=filename, producto_id=producto.id)
+                    foto = FotoProducto(ruta=guardar_foto(file), producto_id=producto.id)
                     db.session.add(foto)
             db.session.commit()
+        cache_catalogo.invalidar(categorias_de(producto))
         flash(f"✅ Producto '{producto.nombre}' agregado correctamente", "success")
         return redirect(url_for("productos"))
     return render_template("nuevo_producto.html", lotes=lotes, categorias=categorias)
@@ -201,6 +455,8 @@ def add_product(lote_id):
                 producto.categorias.append(cat)
 
         db.session.add(producto)
+        db.session.flush()
+        registrar_cambios([producto.id], "alta")
         db.session.commit()
 
         # fotos (misma lógica)
@@ -210,18 +466,10 @@ def add_product(lote_id):
         else:
             for file in files[:4]:
                 if file and file.filename and allowed_file(file.filename):
-                    filename = secure_filename(file.filename)
-                    filepath = os.path.join(app.config["UPLOAD_FOLDER"], filename)
-                    base, ext = os.path.splitext(filename)
-                    counter = 1
-                    while os.path.exists(os.path.join(BASE_DIR, filepath)):
-                        filename = f"{base}_{counter}{ext}"
-                        filepath = os.path.join(app.config["UPLOAD_FOLDER"], filename)
-                        counter += 1
-                    file.save(os.path.join(BASE_DIR, filepath))
-                    foto = FotoProducto(ruta=filename, producto_id=producto.id)
+                    foto = FotoProducto(ruta=guardar_foto(file), producto_id=producto.id)
                     db.session.add(foto)
             db.session.commit()
+        cache_catalogo.invalidar(categorias_de(producto))
 
         flash(f"✅ Producto agregado al lote {lote.id}", "success")
         return redirect(url_for("lotes"))
@@ -249,6 +497,7 @@ def editar_producto(producto_id):
         producto.lote_id = request.form.get("lote_id") or None
 
         # actualizar categorías
+        afectadas = categorias_de(producto)
         seleccionadas = request.form.getlist("categorias")
         producto.categorias = []
         for cid in seleccionadas:
@@ -256,41 +505,27 @@ def editar_producto(producto_id):
             if cat:
                 producto.categorias.append(cat)
 
+        registrar_cambios([producto.id], "modificacion")
         db.session.commit()
 
         files = request.files.getlist("fotos")
         remaining = 4 - len(producto.fotos)
         for file in files[:remaining]:
             if file and file.filename and allowed_file(file.filename):
-                filename = secure_filename(file.filename)
-                filepath = os.path.join(app.config["UPLOAD_FOLDER"], filename)
-                base, ext = os.path.splitext(filename)
-                counter = 1
-                while os.path.exists(os.path.join(BASE_DIR, filepath)):
-                    filename = f"{base}_{counter}{ext}"
-                    filepath = os.path.join(app.config["UPLOAD_FOLDER"], filename)
-                    counter += 1
-                file.save(os.path.join(BASE_DIR, filepath))
-                foto = FotoProducto(ruta=filename, producto_id=producto.id)
+                foto = FotoProducto(ruta=guardar_foto(file), producto_id=producto.id)
                 db.session.add(foto)
         db.session.commit()
+        cache_catalogo.invalidar(afectadas | categorias_de(producto))
         flash("✅ Producto actualizado", "success")
         return redirect(url_for("productos"))
     return render_template("editar_producto.html", producto=producto, lotes=lotes, categorias=categorias)
 
 @app.route("/producto/<int:producto_id>/eliminar", methods=["POST"])
 def eliminar_producto(producto_id):
-    producto = Producto.query.get_or_404(producto_id)
-    for f in list(producto.fotos):
-        path = os.path.join(BASE_DIR, app.config["UPLOAD_FOLDER"], f.ruta)
-        try:
-            if os.path.exists(path):
-                os.remove(path)
-        except Exception:
-            pass
-        db.session.delete(f)
-    db.session.delete(producto)
+    Producto.query.get_or_404(producto_id)
+    afectadas = eliminar_productos(Producto.id == producto_id)
     db.session.commit()
+    cache_catalogo.invalidar(afectadas)
     flash("🗑️ Producto y fotos eliminados", "success")
     return redirect(url_for("productos"))
 
@@ -298,50 +533,147 @@ def eliminar_producto(producto_id):
 def eliminar_foto(foto_id):
     foto = FotoProducto.query.get_or_404(foto_id)
     producto_id = foto.producto_id
-    path = os.path.join(BASE_DIR, app.config["UPLOAD_FOLDER"], foto.ruta)
-    try:
-        if os.path.exists(path):
-            os.remove(path)
-    except Exception:
-        pass
+    afectadas = categorias_de(foto.producto)
+    soltar_foto(foto)
     db.session.delete(foto)
     db.session.commit()
+    cache_catalogo.invalidar(afectadas)
     flash("🗑️ Foto eliminada", "success")
     return redirect(url_for("editar_producto", producto_id=producto_id))
 
 # ---------- VENTAS ----------
 @app.route("/venta", methods=["GET","POST"])
 def ventas():
-    productos = Producto.query.filter(Producto.cantidad>0).all()
     if request.method == "POST":
-        producto_id = int(request.form.get("producto_id"))
-        cantidad = int(request.form.get("cantidad",0) or 0)
-        precio_venta = float(request.form.get("precio_venta",0) or 0)
-        
-        producto = Producto.query.get(producto_id)
-        
-        if not producto:
-            flash("❌ Producto no encontrado", "error")
-            return redirect(url_for("ventas"))
-        
-        if cantidad > producto.cantidad:
-            flash(f"❌ No hay suficiente stock. Disponible: {producto.cantidad}", "error")
+        try:
+            linea = (int(request.form.get("producto_id")),
+                     int(request.form.get("cantidad",0) or 0),
+                     float(request.form.get("precio_venta",0) or 0))
+        except (TypeError, ValueError):
+            flash("❌ Datos de la venta inválidos", "error")
             return redirect(url_for("ventas"))
-        producto.cantidad -= cantidad
-        venta = Venta(producto_id=producto.id, cantidad=cantidad, precio_venta=precio_venta)
-        
-        db.session.add(venta)
-        db.session.commit()
-        flash("✅ Venta registrada", "success")
+        error = confirmar_pedido([linea])
+        if error:
+            flash(f"❌ {error}", "error")
+        else:
+            flash("✅ Venta registrada", "success")
+        return redirect(url_for("ventas"))
+    ventas, paginacion = pagina(ventas_historial(), CLAVE_VENTAS, descendente=True)
+    return render_template("ventas.html", ventas=ventas, paginacion=paginacion)
+
+@app.route("/pedido", methods=["GET","POST"])
+def pedido():
+    """Varias ventas en una sola transacción: o se registran todas o ninguna."""
+    if request.method == "POST":
+        try:
+            if request.is_json:
+                lineas = [(int(l["producto_id"]), int(l["cantidad"]), float(l["precio_venta"]))
+                          for l in (request.get_json(silent=True).get("lineas") or [])]
+            else:
+                lineas = [(int(pid), int(cant or 0), float(precio or 0))
+                          for pid, cant, precio in zip(request.form.getlist("producto_id"),
+                                                       request.form.getlist("cantidad"),
+                                                       request.form.getlist("precio_venta"))
+                          if pid]
+        except (AttributeError, KeyError, TypeError, ValueError):
+            lineas, error = None, LineaInvalida("Datos del pedido inválidos")
+        else:
+            error = confirmar_pedido(lineas)
+
+        if request.is_json:
+            if error:
+                return jsonify({"ok": False, "error": str(error)}), estado_pedido(error)
+            return jsonify({"ok": True, "ventas": len(lineas)}), 201
+        if error:
+            flash(f"❌ {error}", "error")
+            return redirect(url_for("pedido"))
+        flash(f"✅ Pedido registrado ({len(lineas)} líneas)", "success")
         return redirect(url_for("ventas"))
-    ventas = Venta.query.order_by(Venta.fecha.desc()).all()
-    return render_template("ventas.html", productos=productos, ventas=ventas)
+
+    productos = Producto.query.filter(Producto.cantidad>0).order_by(Producto.nombre).all()
+    return render_template("pedido.html", productos=productos, filas=range(5))
+
+@app.route("/venta/exportar")
+def exportar_ventas():
+    return exportar_csv("ventas.csv", VENTAS_COLUMNAS, filas_ventas())
 
 # ---------- STOCK ----------
 @app.route("/stock")
 def stock():
-    productos = Producto.query.order_by(Producto.nombre).all()
-    return render_template("stock.html", productos=productos)
+    productos, paginacion = pagina(Producto.query, CLAVE_PRODUCTOS)
+    return render_template("stock.html", productos=productos, paginacion=paginacion)
+
+@app.route("/stock/exportar")
+def exportar_stock():
+    return exportar_csv("stock.csv", STOCK_COLUMNAS, filas_stock())
+
+# ---------- REPORTES ----------
+def reporte_pedido():
+    """calcular_reporte() con los filtros ?desde=&hasta=&dias= (hasta inclusive)."""
+    desde = request.args.get("desde", type=parse_fecha)
+    hasta = request.args.get("hasta", type=parse_fecha)
+    if hasta:
+        hasta += timedelta(days=1)
+    dias = max(request.args.get("dias", DIAS_VELOCIDAD, type=int), 1)
+    return calcular_reporte(desde, hasta, dias), dias
+
+@app.route("/reportes")
+def reportes():
+    reporte, dias = reporte_pedido()
+    return render_template("reportes.html", reporte=reporte, columnas=REPORTES, dias=dias,
+                           max_filas=app.config["REPORTE_FILAS_HTML"])
+
+@app.route("/reportes/<tabla>.csv")
+def exportar_reporte(tabla):
+    if tabla not in REPORTES:
+        abort(404)
+    reporte, _ = reporte_pedido()
+    return exportar_csv(f"reporte_{tabla}.csv", REPORTES[tabla], reporte[tabla])
+
+# ---------- BÚSQUEDA ----------
+@app.route("/buscar")
+def buscar():
+    q = request.args.get("q", "").strip()
+    productos = buscar_productos(q, limite=50) if q else []
+    return render_template("buscar.html", q=q, productos=productos)
+
+@app.route("/api/productos/buscar")
+def api_buscar_productos():
+    """Autocompletado: ?q=texto[&con_stock=1][&limite=10]."""
+    q = request.args.get("q", "")
+    limite = max(1, min(request.args.get("limite", 10, type=int), 50))
+    productos = buscar_productos(q, limite=limite, con_stock=bool(request.args.get("con_stock")))
+    return jsonify([{
+        "id": p.id,
+        "nombre": p.nombre,
+        "cantidad": p.cantidad,
+        "precio_sugerido": p.precio_sugerido,
+        "categorias": [c.nombre for c in p.categorias],
+    } for p in productos])
+
+# ---------- IMPORTAR / EXPORTAR ----------
+@app.route("/importar", methods=["GET","POST"])
+def importar_datos():
+    resultado = None
+    if request.method == "POST":
+        entidad = request.form.get("entidad")
+        archivo = request.files.get("archivo")
+        if entidad not in ENTIDADES or not archivo or not archivo.filename:
+            flash("❌ Elegí qué importar y un archivo CSV o JSON", "error")
+            return redirect(url_for("importar_datos"))
+        resultado = importar(entidad, archivo.stream, formato_de(archivo.filename),
+                             estricto=bool(request.form.get("estricto")))
+        cache_catalogo.invalidar()
+    return render_template("importar.html", entidades=ENTIDADES, resultado=resultado)
+
+@app.route("/exportar/<entidad>")
+def exportar(entidad):
+    if entidad not in EXPORTACIONES:
+        abort(404)
+    columnas, filas = EXPORTACIONES[entidad]
+    if request.args.get("formato") == "json":
+        return exportar_json(f"{entidad}.jsonl", columnas, filas())
+    return exportar_csv(f"{entidad}.csv", columnas, filas())
 
 # ---------- CATEGORIAS ----------
 @app.route("/categorias")
@@ -357,6 +689,7 @@ def nueva_categoria():
             if not Categoria.query.filter_by(nombre=nombre).first():
                 db.session.add(Categoria(nombre=nombre))
                 db.session.commit()
+                cache_catalogo.invalidar()
                 flash("✅ Categoría creada", "success")
             else:
                 flash("❌ La categoría ya existe", "error")
@@ -371,6 +704,7 @@ def editar_categoria(id):
         if nombre:
             categoria.nombre = nombre
             db.session.commit()
+            cache_catalogo.invalidar()
             flash("✅ Categoría actualizada", "success")
             return redirect(url_for("categorias"))
         else:
@@ -379,36 +713,54 @@ def editar_categoria(id):
 
 @app.route("/categoria/<int:id>/eliminar", methods=["POST"])
 def eliminar_categoria(id):
-    categoria = Categoria.query.get_or_404(id)
-
-    # quitar productos asociados antes de borrar
-    for p in categoria.productos:
-        p.categorias.remove(categoria)
-
-    db.session.delete(categoria)
+    Categoria.query.get_or_404(id)
+    borrar_categoria(id)
     db.session.commit()
+    cache_catalogo.invalidar()
     flash("❌ Categoría eliminada", "success")
     return redirect(url_for("categorias"))
 
 
 @app.route('/uploads/<path:filename>')
 def uploaded_file(filename):
-    return send_from_directory(os.path.join(BASE_DIR, app.config['UPLOAD_FOLDER']), filename)
+    # send_from_directory ya responde If-None-Match/If-Modified-Since y Range
+    if not es_blob(filename):
+        return send_from_directory(carpeta_uploads(), filename)
+    # nombre por contenido: el archivo nunca cambia, se puede cachear "para siempre"
+    response = send_from_directory(carpeta_uploads(), filename, max_age=app.config["UPLOADS_MAX_AGE"])
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
 
 # ---------- CATÁLOGO PÚBLICO ----------
 @app.route("/catalogo")
 def catalogo():
     categoria_id = request.args.get("categoria", type=int)
+    # con mensajes flash pendientes la página es personal: no se cachea
+    if session.get("_flashes"):
+        return render_catalogo(categoria_id)
+
+    clave = (categoria_id, request.args.get("cursor"))
+    entrada = cache_catalogo.get(clave)
+    if entrada is None:
+        entrada = cache_catalogo.set(clave, render_catalogo(categoria_id))
+
+    response = make_response(entrada.html)
+    response.set_etag(entrada.etag)
+    response.last_modified = entrada.modificado
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+def render_catalogo(categoria_id):
     categorias = Categoria.query.order_by(Categoria.nombre).all()
-    
+
     if categoria_id:
-        categoria = Categoria.query.get_or_404(categoria_id)
-        productos = categoria.productos
-    else:
-        productos = Producto.query.order_by(Producto.nombre).all()
+        Categoria.query.get_or_404(categoria_id)
+    productos, paginacion = pagina(productos_catalogo(categoria_id), CLAVE_PRODUCTOS)
 
     return render_template("catalogo.html",
                            productos=productos,
+                           paginacion=paginacion,
                            categorias=categorias,
                            categoria_id=categoria_id)
 
@@ -0,0 +1,76 @@
+from sqlalchemy import delete, func, select, update
+from models import db, producto_categoria, Blob, Categoria, FotoProducto, Lote, Producto, ResumenVenta, Venta
+from cambios import registrar_cambios
+from jobs import encolar
+
+# Bajas en bloque: cada tabla se limpia con un DELETE ... WHERE producto_id IN
+# (SELECT ...), así la cantidad de sentencias no depende de cuántos productos
+# o fotos haya. No se cargan objetos ni se usan los cascade del ORM.
+#
+# Las ventas (y sus acumulados) son historia y se conservan: quedan con
+# producto_id en NULL y la venta guarda el nombre del producto. Se hace acá
+# y no con el ON DELETE SET NULL para no depender de que la base aplique las
+# claves foráneas. Los archivos de las fotos se borran después del commit,
+# en un trabajo.
+
+
+def eliminar_productos(*condiciones):
+    """Borra los productos que cumplen `condiciones` con sus fotos y categorías.
+
+    Todo queda en la transacción en curso (no hace commit). Devuelve los ids
+    de las categorías afectadas, para invalidar el catálogo.
+    """
+    ids = select(Producto.id).where(*condiciones).scalar_subquery()
+    producto_ids = db.session.scalars(select(Producto.id).where(*condiciones)).all()
+    if not producto_ids:
+        return set()
+    afectadas = set(db.session.scalars(
+        select(producto_categoria.c.categoria_id).distinct()
+        .where(producto_categoria.c.producto_id.in_(ids))))
+
+    nombre = select(Producto.nombre).where(Producto.id == Venta.producto_id).scalar_subquery()
+    db.session.execute(update(Venta).where(Venta.producto_id.in_(ids))
+                       .values(producto_nombre=nombre, producto_id=None),
+                       execution_options={"synchronize_session": False})
+    db.session.execute(update(ResumenVenta).where(ResumenVenta.producto_id.in_(ids))
+                       .values(producto_id=None),
+                       execution_options={"synchronize_session": False})
+    _soltar_fotos(FotoProducto.producto_id.in_(ids))
+    db.session.execute(delete(FotoProducto).where(FotoProducto.producto_id.in_(ids)),
+                       execution_options={"synchronize_session": False})
+    db.session.execute(delete(producto_categoria).where(producto_categoria.c.producto_id.in_(ids)))
+    db.session.execute(delete(Producto).where(*condiciones),
+                       execution_options={"synchronize_session": False})
+    registrar_cambios(producto_ids, "baja")  # se escriben al hacer commit
+    return afectadas
+
+
+def _soltar_fotos(condicion):
+    """Resta las referencias de los blobs de esas fotos y agenda los que quedan sin uso."""
+    usadas = select(FotoProducto.ruta).where(condicion)
+    cuantas = (select(func.count()).where(condicion, FotoProducto.ruta == Blob.ruta)
+               .correlate(Blob).scalar_subquery())
+    db.session.execute(update(Blob).where(Blob.ruta.in_(usadas))
+                       .values(referencias=Blob.referencias - cuantas),
+                       execution_options={"synchronize_session": False})
+    # las fotos anteriores a la tabla de blobs no tienen fila: también se agendan
+    huerfanas = db.session.scalars(
+        select(FotoProducto.ruta).distinct().where(condicion)
+        .where(~FotoProducto.ruta.in_(select(Blob.ruta).where(Blob.referencias > 0)))).all()
+    if huerfanas:
+        encolar("borrar_fotos", rutas=sorted(huerfanas))
+
+
+def eliminar_lote(lote_id):
+    """Borra el lote y todos sus productos. Devuelve las categorías afectadas."""
+    afectadas = eliminar_productos(Producto.lote_id == lote_id)
+    db.session.execute(delete(Lote).where(Lote.id == lote_id),
+                       execution_options={"synchronize_session": False})
+    return afectadas
+
+
+def eliminar_categoria(categoria_id):
+    """Borra la categoría y sus enlaces; los productos quedan."""
+    db.session.execute(delete(producto_categoria).where(producto_categoria.c.categoria_id == categoria_id))
+    db.session.execute(delete(Categoria).where(Categoria.id == categoria_id),
+                       execution_options={"synchronize_session": False})
@@ -0,0 +1,59 @@
+"""Mide calcular_reporte() con cantidades crecientes de ventas.
+
+    python bench_reportes.py [--productos 2000] [--ventas 10000,100000,1000000]
+
+Trabaja sobre una base SQLite temporal (no toca stock.db). Para cada tamaño
+inserta las ventas que faltan, reconstruye los acumulados y toma la mediana
+de varias corridas del reporte completo.
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+
+def medir(funcion, repeticiones):
+    tiempos = []
+    for _ in range(repeticiones):
+        t0 = time.perf_counter()
+        funcion()
+        tiempos.append(time.perf_counter() - t0)
+    return statistics.median(tiempos)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--productos", type=int, default=2000)
+    parser.add_argument("--ventas", default="10000,100000,1000000",
+                        help="tamaños a medir, separados por coma")
+    parser.add_argument("--repeticiones", type=int, default=5)
+    args = parser.parse_args()
+    tamanos = sorted(int(t) for t in args.ventas.split(","))
+
+    os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench.db")
+    os.environ["TRABAJOS_HILOS"] = "0"
+    random.seed(1)
+    from app import app
+    from models import ResumenVenta
+    from stats import reconstruir_resumenes
+    from reportes import calcular_reporte
+    from datos_prueba import generar_catalogo, generar_ventas
+
+    print(f"{'ventas':>10} {'filas resumen':>14} {'acumulados (s)':>15} {'reporte (ms)':>13} {'µs/venta':>9}")
+    with app.app_context():
+        producto_ids = generar_catalogo(lotes=50, productos=args.productos, categorias=20)
+        cargadas = 0
+        for tamano in tamanos:
+            generar_ventas(tamano - cargadas, producto_ids)
+            cargadas = tamano
+            t_acumulados = medir(reconstruir_resumenes, 1)
+            filas = ResumenVenta.query.count()
+            t_reporte = medir(calcular_reporte, args.repeticiones)
+            print(f"{tamano:>10} {filas:>14} {t_acumulados:>15.2f} {t_reporte * 1000:>13.1f} "
+                  f"{t_reporte / tamano * 1e6:>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+"""Benchmark de todas las rutas de app.py con el cliente de pruebas de Flask.
+
+    python benchmark.py [--escala chica|mediana|grande] [--repeticiones 30]
+                        [--guardar-base benchmark_base.json] [--comparar benchmark_base.json [--latencia]]
+
+Genera una base SQLite temporal con datos_prueba (no toca stock.db ni
+static/uploads) y mide cada ruta: latencia p50/p95/p99, consultas SQL por
+request y pico de memoria asignada. Con --comparar marca las rutas que
+empeoraron respecto de la base guardada y sale con código 1.
+
+La base del repo sirve en cualquier máquina para las consultas y la
+memoria, que no dependen del hardware. La latencia solo se compara con
+--latencia, y contra una base grabada en la misma máquina (--guardar-base).
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+UMBRAL = 0.20     # empeoramiento relativo tolerado (latencia y memoria)
+PISO_MS = 2.0     # diferencias de latencia menores a esto son ruido
+PISO_KB = 64.0
+
+
+class Contexto:
+    """Ids disponibles para armar cada request.
+
+    Las rutas destructivas borran filas creadas aparte, una por request, así
+    no cambian los datos que miden las demás rutas.
+    """
+
+    def __init__(self, db, repeticiones, carpeta_fotos):
+        from models import Categoria, Lote, Producto
+        from datos_prueba import generar_catalogo
+
+        def ids(col, *filtros):
+            return db.session.scalars(db.select(col).where(*filtros).order_by(col)).all()
+
+        self.productos = ids(Producto.id)
+        self.con_stock = ids(Producto.id, Producto.cantidad > 100)
+        self.lote = ids(Lote.id)[0]
+        self.categoria = ids(Categoria.id)[0]
+
+        necesarios = repeticiones + 2  # calentamiento + medición de memoria
+        ultimo_lote, ultima_categoria = ids(Lote.id)[-1], ids(Categoria.id)[-1]
+        self.borrar_productos = generar_catalogo(0, necesarios, 0, 1, carpeta_fotos)
+        generar_catalogo(necesarios, necesarios * 5, 0, 1, carpeta_fotos)
+        self.borrar_lotes = ids(Lote.id, Lote.id > ultimo_lote)
+        generar_catalogo(0, 0, necesarios)
+        self.borrar_categorias = ids(Categoria.id, Categoria.id > ultima_categoria)
+
+    def producto(self):
+        return random.choice(self.productos)
+
+    def vendible(self):
+        return random.choice(self.con_stock or self.productos)
+
+
+def _venta(ctx):
+    return {"producto_id": ctx.vendible(), "cantidad": 1, "precio_venta": 1000}
+
+
+def _producto_form(ctx, nombre="Producto benchmark"):
+    return {"nombre": nombre, "cantidad": 10, "precio_compra": 1000, "costo_envio_unitario": 50,
+            "costo_extra": 0, "margen": 0.5, "lote_id": ctx.lote, "categorias": [ctx.categoria]}
+
+
+# nombre -> (método, url(ctx), datos(ctx) o None, json?)
+RUTAS = {
+    "dashboard": ("GET", lambda c: "/dashboard", None, False),
+    "lotes": ("GET", lambda c: "/lotes", None, False),
+    "productos": ("GET", lambda c: "/productos", None, False),
+    "producto_detalle": ("GET", lambda c: f"/producto/{c.producto()}", None, False),
+    "stock": ("GET", lambda c: "/stock", None, False),
+    "catalogo": ("GET", lambda c: "/catalogo", None, False),
+    "catalogo_categoria": ("GET", lambda c: f"/catalogo?categoria={c.categoria}", None, False),
+    "categorias": ("GET", lambda c: "/categorias", None, False),
+    "ventas_get": ("GET", lambda c: "/venta", None, False),
+    "buscar": ("GET", lambda c: "/buscar?q=remera", None, False),
+    "reportes": ("GET", lambda c: "/reportes", None, False),
+    "exportar_stock": ("GET", lambda c: "/stock/exportar", None, False),
+    "api_productos": ("GET", lambda c: "/api/v1/productos?campos=id,cantidad,precio_sugerido&limite=200", None, False),
+    "api_autocompletar": ("GET", lambda c: "/api/productos/buscar?q=gor&con_stock=1", None, False),
+    "api_cambios": ("GET", lambda c: "/api/v1/cambios?desde=0", None, False),
+    "ventas_post": ("POST", lambda c: "/venta", _venta, False),
+    "pedido_json": ("POST", lambda c: "/pedido", lambda c: {"lineas": [_venta(c), _venta(c)]}, True),
+    "nuevo_producto": ("POST", lambda c: "/producto/nuevo", _producto_form, False),
+    "editar_producto": ("POST", lambda c: f"/producto/{c.producto()}/editar",
+                        lambda c: _producto_form(c, "Producto editado"), False),
+    "edit_lote": ("POST", lambda c: f"/lotes/{c.lote}/edit", lambda c: {"costo_envio": 20000}, False),
+    # destructivas: al final, cada request con su propio id
+    "eliminar_producto": ("POST", lambda c: f"/producto/{c.borrar_productos.pop()}/eliminar", None, False),
+    "eliminar_categoria": ("POST", lambda c: f"/categoria/{c.borrar_categorias.pop()}/eliminar", None, False),
+    "delete_lote": ("POST", lambda c: f"/lote/{c.borrar_lotes.pop()}/eliminar", None, False),
+}
+
+
+def _percentil(valores, p):
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, round(p / 100 * (len(ordenados) - 1)))]
+
+
+def medir_ruta(cliente, ctx, contador, nombre, repeticiones):
+    metodo, url, datos, es_json = RUTAS[nombre]
+
+    def pedir():
+        kwargs = {}
+        if datos:
+            kwargs["json" if es_json else "data"] = datos(ctx)
+        return cliente.open(url(ctx), method=metodo, **kwargs)
+
+    pedir()  # calentamiento (templates, caches)
+    tiempos, consultas, estados = [], [], set()
+    for _ in range(repeticiones):
+        contador[0] = 0
+        t0 = time.perf_counter()
+        respuesta = pedir()
+        _ = respuesta.data  # consumir respuestas en streaming
+        tiempos.append((time.perf_counter() - t0) * 1000)
+        consultas.append(contador[0])
+        estados.add(respuesta.status_code)
+
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    pedir().data
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "p50_ms": round(statistics.median(tiempos), 2),
+        "p95_ms": round(_percentil(tiempos, 95), 2),
+        "p99_ms": round(_percentil(tiempos, 99), 2),
+        "consultas": int(statistics.median(consultas)),
+        "memoria_kb": round(pico / 1024, 1),
+        "estados": sorted(estados),
+    }
+
+
+def comparar(actual, base, latencia=False):
+    """Lista de (ruta, motivo) de lo que empeoró respecto de `base`."""
+    regresiones = []
+    for nombre, r in actual.items():
+        b = base.get(nombre)
+        if not b:
+            continue
+        if latencia and r["p50_ms"] > b["p50_ms"] * (1 + UMBRAL) and r["p50_ms"] - b["p50_ms"] > PISO_MS:
+            regresiones.append((nombre, f"p50 {b['p50_ms']} -> {r['p50_ms']} ms"))
+        if r["consultas"] > b["consultas"]:
+            regresiones.append((nombre, f"consultas {b['consultas']} -> {r['consultas']}"))
+        if r["memoria_kb"] > b["memoria_kb"] * (1 + UMBRAL) and r["memoria_kb"] - b["memoria_kb"] > PISO_KB:
+            regresiones.append((nombre, f"memoria {b['memoria_kb']} -> {r['memoria_kb']} KB"))
+    return regresiones
+
+
+def _delta(actual, base, campo):
+    if not base or not base.get(campo):
+        return ""
+    return f"{(actual[campo] - base[campo]) / base[campo] * 100:+.0f}%"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--escala", default="chica")
+    parser.add_argument("--repeticiones", type=int, default=30)
+    parser.add_argument("--rutas", help="solo estas rutas, separadas por coma")
+    parser.add_argument("--semilla", type=int, default=1)
+    parser.add_argument("--guardar-base", metavar="ARCHIVO", help="guardar los resultados como base")
+    parser.add_argument("--comparar", metavar="ARCHIVO", help="comparar contra una base guardada")
+    parser.add_argument("--latencia", action="store_true",
+                        help="comparar también el p50 (solo contra una base de esta máquina)")
+    parser.add_argument("--salida", metavar="ARCHIVO", help="guardar los resultados en JSON")
+    args = parser.parse_args()
+
+    carpeta = tempfile.mkdtemp(prefix="stock-bench-")
+    os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(carpeta, "bench.db")
+    os.environ["UPLOAD_FOLDER"] = os.path.join(carpeta, "uploads")
+    os.environ["TRABAJOS_HILOS"] = "0"
+    from app import app
+    from models import db
+    from datos_prueba import generar, ESCALAS
+    from sqlalchemy import event
+
+    if args.escala not in ESCALAS:
+        parser.error(f"escala desconocida: {args.escala} (opciones: {', '.join(ESCALAS)})")
+    rutas = args.rutas.split(",") if args.rutas else list(RUTAS)
+    desconocidas = set(rutas) - RUTAS.keys()
+    if desconocidas:
+        parser.error(f"rutas desconocidas: {', '.join(sorted(desconocidas))}")
+
+    random.seed(args.semilla)
+    contador = [0]
+    with app.app_context():
+        t0 = time.perf_counter()
+        generar(**ESCALAS[args.escala], carpeta_fotos=os.path.join(carpeta, "uploads"), semilla=args.semilla)
+        print(f"Datos '{args.escala}' generados en {time.perf_counter() - t0:.1f}s ({carpeta})")
+        ctx = Contexto(db, args.repeticiones, os.path.join(carpeta, "uploads"))
+        event.listen(db.engine, "before_cursor_execute",
+                     lambda *a: contador.__setitem__(0, contador[0] + 1))
+
+    base = {}
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as f:
+            base = json.load(f)["rutas"]
+
+    cliente = app.test_client()
+    resultados = {}
+    print(f"{'ruta':<20} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'SQL':>5} {'mem KB':>9}  {'Δp50':>6} {'Δmem':>6}  estados")
+    for nombre in rutas:
+        r = resultados[nombre] = medir_ruta(cliente, ctx, contador, nombre, args.repeticiones)
+        b = base.get(nombre)
+        print(f"{nombre:<20} {r['p50_ms']:>8} {r['p95_ms']:>8} {r['p99_ms']:>8} {r['consultas']:>5} "
+              f"{r['memoria_kb']:>9}  {_delta(r, b, 'p50_ms'):>6} {_delta(r, b, 'memoria_kb'):>6}  "
+              f"{','.join(map(str, r['estados']))}")
+
+    informe = {
+        "meta": {"escala": args.escala, "repeticiones": args.repeticiones,
+                 "python": platform.python_version(), "fecha": datetime.utcnow().isoformat(timespec="seconds")},
+        "rutas": resultados,
+    }
+    for archivo in filter(None, (args.salida, args.guardar_base)):
+        with open(archivo, "w", encoding="utf-8") as f:
+            json.dump(informe, f, indent=2, ensure_ascii=False)
+        print(f"Resultados guardados en {archivo}")
+
+    errores = [n for n, r in resultados.items() if any(e >= 400 for e in r["estados"])]
+    if errores:
+        print(f"⚠️ Rutas con errores HTTP: {', '.join(errores)}")
+    if args.comparar:
+        regresiones = comparar(resultados, base, latencia=args.latencia)
+        for nombre, motivo in regresiones:
+            print(f"❌ {nombre}: {motivo}")
+        if regresiones:
+            sys.exit(1)
+        print("✅ Sin regresiones respecto de la base")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+import hashlib
+import json
+import os
+import re
+import tempfile
+from collections import defaultdict
+from sqlalchemy import delete, event, insert, select
+from PIL import Image
+from sqlalchemy.orm import Session
+from werkzeug.utils import secure_filename
+from models import db, insert_upsert, Blob, FotoProducto, Trabajo
+from images import eliminar_variantes, ruta_variante, CARPETA_VARIANTES, VARIANTES
+
+NOMBRE_BLOB = re.compile(r"^[0-9a-f]{32}\.[a-z0-9]+$")
+NOMBRE_VARIANTE = re.compile(r"^[0-9a-f]{32}_(%s)\.webp$" % "|".join(VARIANTES))
+# la extensión sale del contenido: el mismo archivo subido como .jpg y como
+# .jpeg es un solo blob (y sus variantes, que van por hash, no se pisan)
+EXTENSIONES = {"JPEG": ".jpg", "PNG": ".png", "GIF": ".gif", "WEBP": ".webp"}
+SINONIMOS = {".jpeg": ".jpg", ".jpe": ".jpg"}
+
+
+def nombre_blob(digest, path, nombre_original):
+    """<hash>.<ext>, con la extensión del formato real de la imagen en `path`."""
+    try:
+        with Image.open(path) as imagen:
+            ext = EXTENSIONES.get(imagen.format)
+    except Exception:  # no es una imagen que Pillow reconozca
+        ext = None
+    if ext is None:
+        ext = os.path.splitext(secure_filename(nombre_original))[1].lower()
+        ext = SINONIMOS.get(ext, ext)
+    return digest[:32] + ext
+
+
+def es_blob(ruta):
+    """True si el nombre deriva del contenido (y por lo tanto nunca cambia).
+
+    Incluye las variantes WebP de un blob, que se generan siempre iguales a
+    partir de él y son lo que sirven los listados.
+    """
+    carpeta, nombre = os.path.split(ruta)
+    if carpeta == CARPETA_VARIANTES:
+        return bool(NOMBRE_VARIANTE.match(nombre))
+    return not carpeta and bool(NOMBRE_BLOB.match(nombre))
+
+
+def _sumar_referencia(ruta, digest, tamano, cantidad=1):
+    """Suma `cantidad` referencias y devuelve el total que quedó."""
+    tabla = Blob.__table__
+    stmt = insert_upsert(tabla).values(ruta=ruta, hash=digest, tamano=tamano, referencias=cantidad)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["ruta"],
+        set_={"referencias": tabla.c.referencias + stmt.excluded.referencias},
+    )
+    return db.session.execute(stmt.returning(tabla.c.referencias)).scalar_one()
+
+
+def guardar_blob(carpeta, stream, nombre_original):
+    """Escribe el contenido una sola vez y suma una referencia al blob.
+
+    Devuelve el nombre (la ruta que va en FotoProducto.ruta). Si ya había un
+    archivo con el mismo contenido en uso se reutiliza y no se escribe nada.
+
+    Si el blob estaba sin uso, su archivo puede estar borrándose: el upsert
+    espera a que termine ese borrado (ver borrar_si_huerfano) y después el
+    archivo se vuelve a escribir desde la copia temporal.
+    """
+    digest = hashlib.sha256()
+    tamano = 0
+    fd, tmp = tempfile.mkstemp(dir=carpeta, suffix=".part")
+    with os.fdopen(fd, "wb") as out:
+        for chunk in iter(lambda: stream.read(65536), b""):
+            digest.update(chunk)
+            tamano += len(chunk)
+            out.write(chunk)
+    ruta = nombre_blob(digest.hexdigest(), tmp, nombre_original)
+    destino = os.path.join(carpeta, ruta)
+    if _sumar_referencia(ruta, digest.hexdigest(), tamano) == 1 or not os.path.exists(destino):
+        os.replace(tmp, destino)
+        # si la transacción no llega al commit nadie referencia el archivo
+        db.session.info.setdefault("blobs_nuevos", set()).add(ruta)
+    else:
+        os.remove(tmp)
+    return ruta
+
+
+@event.listens_for(Session, "after_commit")
+def _confirmar_blobs_nuevos(session):
+    session.info.pop("blobs_nuevos", None)
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _agendar_blobs_sin_uso(session, transaction):
+    """Agenda la verificación de los archivos escritos en una transacción sin commit.
+
+    Cubre el rollback explícito y la sesión que se cierra al final del
+    request sin confirmar. El trabajo va en una transacción aparte (la de la
+    sesión ya no existe) y borrar_si_huerfano decide: otra subida del mismo
+    contenido pudo haberlo referenciado mientras tanto.
+    """
+    if transaction.parent is not None:
+        return
+    rutas = session.info.pop("blobs_nuevos", None)
+    if not rutas:
+        return
+    with session.get_bind().begin() as conn:
+        conn.execute(insert(Trabajo), [{"tipo": "borrar_foto", "datos": json.dumps({"ruta": ruta})}
+                                       for ruta in sorted(rutas)])
+
+
+def soltar_blob(ruta):
+    """Resta una referencia. Devuelve True si el blob quedó sin uso."""
+    Blob.query.filter(Blob.ruta == ruta, Blob.referencias > 0) \
+        .update({"referencias": Blob.referencias - 1}, synchronize_session=False)
+    blob = db.session.get(Blob, ruta)
+    return blob is None or blob.referencias <= 0
+
+
+def borrar_si_huerfano(carpeta, ruta):
+    """Borra archivo, variantes y fila del blob si nadie lo referencia.
+
+    El llamador hace el commit. El DELETE condicional bloquea la fila (en
+    SQLite, la base) hasta entonces, y los archivos se borran antes: una
+    subida del mismo contenido espera en su upsert y, al seguir, vuelve a
+    escribir el archivo. Si la subida llegó primero, el DELETE espera su
+    commit y ya no encuentra el contador en cero.
+    """
+    # fotos anteriores a la tabla de blobs no tienen contador: verificar igual
+    if db.session.scalar(select(FotoProducto.id).where(FotoProducto.ruta == ruta).limit(1)):
+        return False
+    borrado = db.session.execute(
+        delete(Blob).where(Blob.ruta == ruta, Blob.referencias <= 0)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if not borrado and db.session.scalar(select(Blob.ruta).where(Blob.ruta == ruta)):
+        return False
+    path = os.path.join(carpeta, ruta)
+    if os.path.exists(path):
+        os.remove(path)
+    eliminar_variantes(carpeta, ruta)
+    return True
+
+
+def _hash_archivo(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(65536), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def deduplicar(carpeta, simular=False):
+    """Migra las fotos existentes a nombres por contenido.
+
+    Renombra cada archivo a su hash, apunta todas las FotoProducto con el
+    mismo contenido al mismo archivo, borra las copias y recalcula los
+    contadores de referencias. Es idempotente.
+    """
+    resultado = {"fotos": 0, "renombradas": 0, "copias_borradas": 0, "faltantes": 0, "blobs": 0}
+    rutas = defaultdict(list)
+    for foto in FotoProducto.query.order_by(FotoProducto.id):
+        rutas[foto.ruta].append(foto)
+        resultado["fotos"] += 1
+
+    destinos = {}  # ruta vieja -> (ruta nueva, hash, tamaño)
+    for ruta in rutas:
+        path = os.path.join(carpeta, ruta)
+        if not os.path.exists(path):
+            resultado["faltantes"] += 1
+            continue
+        digest = _hash_archivo(path)
+        destinos[ruta] = (nombre_blob(digest, path, ruta), digest, os.path.getsize(path))
+
+    referencias = defaultdict(int)
+    for ruta, (nueva, digest, tamano) in destinos.items():
+        referencias[(nueva, digest, tamano)] += len(rutas[ruta])
+        if ruta == nueva:
+            continue
+        resultado["renombradas"] += len(rutas[ruta])
+        if simular:
+            continue
+        origen, destino = os.path.join(carpeta, ruta), os.path.join(carpeta, nueva)
+        if os.path.exists(destino):
+            os.remove(origen)
+            resultado["copias_borradas"] += 1
+        else:
+            os.replace(origen, destino)
+        if ruta_variante(ruta, "thumb") != ruta_variante(nueva, "thumb"):
+            eliminar_variantes(carpeta, ruta)  # si no, son las del blob que queda
+        for foto in rutas[ruta]:
+            foto.ruta = nueva
+
+    resultado["blobs"] = len(referencias)
+    if simular:
+        db.session.rollback()
+        return resultado
+
+    db.session.execute(Blob.__table__.delete())
+    if referencias:
+        db.session.execute(Blob.__table__.insert(), [
+            {"ruta": ruta, "hash": digest, "tamano": tamano, "referencias": n}
+            for (ruta, digest, tamano), n in referencias.items()
+        ])
+    db.session.commit()
+    return resultado
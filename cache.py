@@ -0,0 +1,75 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from datetime import datetime, timezone
+
+Entrada = namedtuple("Entrada", "html etag modificado vence")
+
+
+class CacheCatalogo:
+    """Cache LRU con vencimiento para las páginas renderizadas del catálogo.
+
+    Las claves son (categoria_id, cursor). Es una cache por proceso: con
+    varios workers de gunicorn cada uno tiene la suya y el TTL acota cuánto
+    puede quedar desactualizada una página en los otros workers.
+    """
+
+    def __init__(self, max_entradas=128, ttl=300):
+        self.max_entradas = max_entradas
+        self.ttl = ttl
+        self._entradas = OrderedDict()
+        self._lock = threading.Lock()
+
+    def configurar(self, max_entradas, ttl):
+        with self._lock:
+            self.max_entradas = max_entradas
+            self.ttl = ttl
+            self._entradas.clear()
+
+    def get(self, clave):
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is None:
+                return None
+            if entrada.vence <= time.monotonic():
+                del self._entradas[clave]
+                return None
+            self._entradas.move_to_end(clave)
+            return entrada
+
+    def set(self, clave, html):
+        entrada = Entrada(
+            html=html,
+            etag=hashlib.sha1(html.encode()).hexdigest(),
+            modificado=datetime.now(timezone.utc).replace(microsecond=0),
+            vence=time.monotonic() + self.ttl,
+        )
+        if self.max_entradas <= 0:
+            return entrada
+        with self._lock:
+            self._entradas[clave] = entrada
+            self._entradas.move_to_end(clave)
+            while len(self._entradas) > self.max_entradas:
+                self._entradas.popitem(last=False)
+        return entrada
+
+    def invalidar(self, categorias=None):
+        """Descarta las páginas de esas categorías y la de "todas".
+
+        Sin argumentos vacía la cache (p. ej. al cambiar las categorías,
+        que aparecen en el filtro de todas las páginas).
+        """
+        with self._lock:
+            if categorias is None:
+                self._entradas.clear()
+                return
+            afectadas = set(categorias) | {None}
+            for clave in [c for c in self._entradas if c[0] in afectadas]:
+                del self._entradas[clave]
+
+    def __len__(self):
+        return len(self._entradas)
+
+
+cache_catalogo = CacheCatalogo()
@@ -0,0 +1,97 @@
+from datetime import datetime, timedelta
+from sqlalchemy import delete, event, func, insert, literal, select, text
+from sqlalchemy.orm import Session
+from models import db, CambioStock, Producto
+
+LIMITE = 500
+BLOQUEO_CAMBIOS = 72_015  # clave del advisory lock en PostgreSQL
+
+# Los cambios se anotan en la sesión y se escriben en before_commit, después
+# de todo el resto de la transacción:
+#  - el INSERT ... SELECT guarda el stock y el precio con que queda el producto;
+#  - en PostgreSQL el advisory lock que ordena los ids (ver _en_orden_de_commit)
+#    se toma recién ahí, cuando la transacción ya tiene todos sus locks de
+#    fila, así que no puede cruzarse con ellos en otro orden (deadlock).
+
+
+def _en_orden_de_commit(session):
+    """Hace que los ids del registro se confirmen en orden.
+
+    Los lectores piden "id > cursor". En PostgreSQL una transacción que tomó
+    el id 10 puede confirmar después de otra que tomó el 11, y quien ya leyó
+    el 11 nunca vería el 10. Con este lock (hasta el commit) las
+    transacciones que escriben cambios se confirman de a una, en orden de id.
+    SQLite ya serializa las escrituras.
+
+    El costo: todas las transacciones que tocan stock, en todas las
+    instancias, hacen fila en este único lock durante su último INSERT y el
+    commit. Es un punto de serialización global que limita cuánto escala la
+    escritura agregando nodos; si llega a molestar, la salida es un cursor
+    que no dependa del orden de los ids (p. ej. xid + watermark).
+    """
+    if session.get_bind().dialect.name == "postgresql":
+        session.execute(text("SELECT pg_advisory_xact_lock(:clave)"), {"clave": BLOQUEO_CAMBIOS})
+
+
+def registrar_cambios(producto_ids, tipo):
+    """Anota los productos para registrar su estado al hacer commit.
+
+    Para las bajas solo se guarda el id, así que da igual si ya se borraron.
+    """
+    ids = sorted(set(producto_ids))
+    if ids:
+        db.session.info.setdefault("cambios_pendientes", []).append((tipo, ids))
+
+
+@event.listens_for(Session, "before_commit")
+def _escribir_cambios(session):
+    pendientes = session.info.pop("cambios_pendientes", None)
+    if not pendientes:
+        return
+    session.flush()  # que el INSERT ... SELECT vea los cambios del ORM
+    _en_orden_de_commit(session)
+    for tipo, ids in pendientes:
+        if tipo == "baja":
+            session.execute(insert(CambioStock), [{"producto_id": i, "tipo": tipo} for i in ids])
+            continue
+        session.execute(insert(CambioStock).from_select(
+            ["producto_id", "tipo", "cantidad", "precio_sugerido"],
+            select(Producto.id, literal(tipo), Producto.cantidad, Producto.precio_sugerido)
+            .where(Producto.id.in_(ids)),
+        ))
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _descartar_cambios(session, transaction):
+    if transaction.parent is None:  # rollback de la transacción de afuera
+        session.info.pop("cambios_pendientes", None)
+
+
+def ultimo_id():
+    return db.session.scalar(select(func.max(CambioStock.id))) or 0
+
+
+def cambios_desde(desde, limite=LIMITE):
+    """Cambios con id mayor a `desde`, en orden."""
+    return db.session.scalars(
+        select(CambioStock).where(CambioStock.id > desde).order_by(CambioStock.id).limit(limite)
+    ).all()
+
+
+def como_dict(cambio):
+    return {
+        "id": cambio.id,
+        "producto_id": cambio.producto_id,
+        "tipo": cambio.tipo,
+        "cantidad": cambio.cantidad,
+        "precio_sugerido": None if cambio.precio_sugerido is None else float(cambio.precio_sugerido),
+        "fecha": cambio.fecha.isoformat() if cambio.fecha else None,
+    }
+
+
+def purgar(dias):
+    """Borra los cambios más viejos que `dias`; devuelve cuántos."""
+    limite = datetime.utcnow() - timedelta(days=dias)
+    borrados = db.session.execute(delete(CambioStock).where(CambioStock.fecha < limite)).rowcount
+    db.session.commit()
+    return borrados
@@ -0,0 +1,228 @@
+import os
+from datetime import datetime
+from sqlalchemy import create_engine, event, inspect, select, text
+from models import db, ResumenVenta, Venta
+import search
+import precios
+import stats
+
+
+def configuracion_db(base_dir):
+    """URI y opciones del pool desde variables de entorno.
+
+    Sin DATABASE_URL se usa el stock.db local. Con varias instancias de
+    gunicorn apuntando a un PostgreSQL compartido se ajustan DB_POOL_*.
+    """
+    uri = os.environ.get("DATABASE_URL") or "sqlite:///" + os.path.join(base_dir, "stock.db")
+    if uri.startswith("postgres://"):  # formato que entregan Render/Heroku
+        uri = "postgresql://" + uri[len("postgres://"):]
+    opciones = {
+        "pool_pre_ping": os.environ.get("DB_POOL_PRE_PING", "1") == "1",
+        "pool_recycle": int(os.environ.get("DB_POOL_RECYCLE", 1800)),
+    }
+    if not uri.startswith("sqlite"):
+        opciones["pool_size"] = int(os.environ.get("DB_POOL_SIZE", 5))
+        opciones["max_overflow"] = int(os.environ.get("DB_MAX_OVERFLOW", 10))
+    return {"SQLALCHEMY_DATABASE_URI": uri, "SQLALCHEMY_ENGINE_OPTIONS": opciones}
+
+
+# Se aplican en cada conexión nueva a SQLite
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",       # los lectores no se bloquean detrás de un escritor
+    "synchronous": "NORMAL",     # seguro con WAL y mucho más rápido que FULL
+    "busy_timeout": 5000,        # ms esperando el lock antes de "database is locked"
+    "cache_size": -64000,        # ~64 MB de cache de páginas (negativo = KiB)
+    "mmap_size": 268435456,      # 256 MB leídos vía mmap
+    "temp_store": "MEMORY",
+    "foreign_keys": "ON",        # como en PostgreSQL: SQLite no las verifica si no se pide
+}
+
+
+def _aplicar_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for nombre, valor in SQLITE_PRAGMAS.items():
+        cursor.execute(f"PRAGMA {nombre}={valor}")
+    cursor.close()
+
+
+def configurar_motor(app):
+    """Registra los PRAGMA de SQLite en el engine de la app (si usa SQLite)."""
+    with app.app_context():
+        if db.engine.dialect.name == "sqlite":
+            event.listen(db.engine, "connect", _aplicar_pragmas)
+
+
+# -------------------- MIGRACIONES --------------------
+# db.create_all() crea tablas nuevas pero nunca modifica las existentes; los
+# cambios sobre tablas ya creadas van acá, en orden y una sola vez cada uno.
+MIGRACIONES = [
+    ("0001_indices", [
+        "CREATE INDEX IF NOT EXISTS ix_venta_fecha ON venta (fecha)",
+        "CREATE INDEX IF NOT EXISTS ix_venta_producto_id ON venta (producto_id)",
+        "CREATE INDEX IF NOT EXISTS ix_producto_nombre ON producto (nombre)",
+        "CREATE INDEX IF NOT EXISTS ix_producto_lote_id ON producto (lote_id)",
+        "CREATE INDEX IF NOT EXISTS ix_producto_cantidad ON producto (cantidad)",
+        "CREATE INDEX IF NOT EXISTS ix_lote_fecha ON lote (fecha)",
+        "CREATE INDEX IF NOT EXISTS ix_producto_categoria_categoria_id ON producto_categoria (categoria_id)",
+    ]),
+    ("0002_busqueda_fts", [search.crear_indice]),
+    ("0003_precios_guardados", [
+        lambda: _agregar_columnas("producto", {"costo_unitario": "NUMERIC(12, 2)",
+                                               "precio_sugerido": "NUMERIC(12, 2)"}),
+        "CREATE INDEX IF NOT EXISTS ix_producto_precio_sugerido ON producto (precio_sugerido)",
+        precios.recalcular_precios,
+    ]),
+    ("0004_costo_en_venta", [
+        lambda: _agregar_columnas("venta", {"costo_unitario": "NUMERIC(12, 2)"}),
+        stats.completar_costos_ventas,
+    ]),
+    # las ventas y sus acumulados sobreviven a la baja del producto
+    ("0005_ventas_sin_producto", [
+        lambda: _agregar_columnas("venta", {"producto_nombre": "VARCHAR(150)"}),
+        lambda: _fk_set_null("venta", "producto_id"),
+        lambda: _fk_set_null("resumen_venta", "producto_id"),
+    ]),
+    ("0006_prefijo_nombre_pg", [search.crear_indice_prefijo]),
+]
+
+
+def _agregar_columnas(tabla, columnas):
+    """ALTER TABLE ADD COLUMN de las que falten (create_all ya las crea en bases nuevas)."""
+    existentes = {c["name"] for c in inspect(db.session.connection()).get_columns(tabla)}
+    for nombre, tipo in columnas.items():
+        if nombre not in existentes:
+            db.session.execute(text(f"ALTER TABLE {tabla} ADD COLUMN {nombre} {tipo}"))
+
+
+def _fk_set_null(tabla, columna):
+    """Deja `columna` nullable y con ON DELETE SET NULL, como en el modelo.
+
+    PostgreSQL lo hace con ALTER TABLE. SQLite no puede cambiar columnas: se
+    recrea la tabla con la definición del modelo y se copian las filas; las
+    que apuntaban a un producto ya borrado quedan en NULL.
+    """
+    conn = db.session.connection()
+    referida = next(iter(db.metadata.tables[tabla].c[columna].foreign_keys)).column.table.name
+    if conn.dialect.name != "sqlite":
+        conn.execute(text(f"ALTER TABLE {tabla} ALTER COLUMN {columna} DROP NOT NULL"))
+        for fk in inspect(conn).get_foreign_keys(tabla):
+            if fk["constrained_columns"] == [columna]:
+                conn.execute(text(f"ALTER TABLE {tabla} DROP CONSTRAINT {fk['name']}"))
+        conn.execute(text(f"ALTER TABLE {tabla} ADD CONSTRAINT fk_{tabla}_{columna} FOREIGN KEY ({columna}) "
+                          f"REFERENCES {referida} (id) ON DELETE SET NULL"))
+        return
+    modelo = db.metadata.tables[tabla]
+    vieja = f"_{tabla}_vieja"
+    columnas = [c["name"] for c in inspect(conn).get_columns(tabla) if c["name"] in modelo.c]
+    for indice in inspect(conn).get_indexes(tabla):
+        conn.execute(text(f"DROP INDEX {indice['name']}"))
+    conn.execute(text(f"ALTER TABLE {tabla} RENAME TO {vieja}"))
+    modelo.create(conn)
+    origen = [f"CASE WHEN {c} IN (SELECT id FROM {referida}) THEN {c} END" if c == columna else c
+              for c in columnas]
+    conn.execute(text(f"INSERT INTO {tabla} ({', '.join(columnas)}) "
+                      f"SELECT {', '.join(origen)} FROM {vieja}"))
+    conn.execute(text(f"DROP TABLE {vieja}"))
+
+
+BLOQUEO_MIGRACIONES = 72_011  # clave del advisory lock en PostgreSQL
+ESPERA_MIGRACIONES_MS = 600_000  # otro proceso puede estar migrando una base grande
+
+
+def _bloquear_migraciones():
+    """Toma un bloqueo exclusivo hasta el commit de la transacción actual.
+
+    Cada worker de gunicorn migra al importar la app: sin esto dos procesos
+    que arrancan juntos aplican la misma migración a la vez.
+    """
+    conn = db.session.connection()
+    if conn.dialect.name == "postgresql":
+        conn.execute(text("SELECT pg_advisory_xact_lock(:clave)"), {"clave": BLOQUEO_MIGRACIONES})
+    elif conn.dialect.name == "sqlite":
+        # BEGIN IMMEDIATE toma el lock de escritura ya; los demás esperan acá
+        conn.exec_driver_sql(f"PRAGMA busy_timeout = {ESPERA_MIGRACIONES_MS}")
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+        conn.exec_driver_sql(f"PRAGMA busy_timeout = {SQLITE_PRAGMAS['busy_timeout']}")
+
+
+def migrar():
+    """Crea las tablas, aplica las migraciones pendientes y devuelve sus nombres.
+
+    Todo corre en una transacción con un bloqueo exclusivo: si varios
+    procesos arrancan a la vez, uno migra y los demás, al obtener el
+    bloqueo, releen schema_migracion y no encuentran nada pendiente.
+    """
+    db.session.rollback()
+    _bloquear_migraciones()
+    db.metadata.create_all(db.session.connection())
+    db.session.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_migracion ("
+        "id VARCHAR(100) PRIMARY KEY, aplicada TIMESTAMP NOT NULL)"
+    ))
+    aplicadas = set(db.session.scalars(text("SELECT id FROM schema_migracion")))
+    nuevas = []
+    for nombre, sentencias in MIGRACIONES:
+        if nombre in aplicadas:
+            continue
+        for sentencia in sentencias:
+            if callable(sentencia):
+                sentencia()
+            else:
+                db.session.execute(text(sentencia))
+        db.session.execute(text("INSERT INTO schema_migracion (id, aplicada) VALUES (:id, :fecha)"),
+                           {"id": nombre, "fecha": datetime.utcnow()})
+        nuevas.append(nombre)
+    # primera ejecución con la tabla de acumulados: poblarla desde el historial
+    if db.session.scalar(select(Venta.id).limit(1)) and not db.session.scalar(select(ResumenVenta.id).limit(1)):
+        stats.reconstruir_resumenes()
+    db.session.commit()
+    return nuevas
+
+
+# -------------------- COPIA ENTRE MOTORES --------------------
+def _normalizar(uri):
+    return "postgresql://" + uri[len("postgres://"):] if uri.startswith("postgres://") else uri
+
+
+def ajustar_secuencia(conn, tabla):
+    """Deja la secuencia de `tabla`.id después del mayor id, tras insertar ids explícitos.
+
+    Solo PostgreSQL: SQLite toma siempre MAX(id) + 1.
+    """
+    if conn.dialect.name == "postgresql":
+        conn.execute(text(
+            f"SELECT setval(pg_get_serial_sequence('{tabla}', 'id'), "
+            f"COALESCE((SELECT MAX(id) FROM {tabla}), 0) + 1, false)"
+        ))
+
+
+def copiar_datos(origen_uri, destino_uri, tanda=1000, progreso=print):
+    """Copia todas las tablas de `origen_uri` a `destino_uri` (p. ej. de stock.db a PostgreSQL).
+
+    Crea el esquema en el destino, copia en tandas respetando las claves
+    foráneas y ajusta las secuencias de ids. El destino debe estar vacío;
+    al arrancar la app contra él, migrar() completa lo que no está en los
+    modelos (p. ej. el índice de búsqueda).
+    """
+    origen = create_engine(_normalizar(origen_uri))
+    destino = create_engine(_normalizar(destino_uri))
+    db.metadata.create_all(destino)
+
+    tablas_origen = set(inspect(origen).get_table_names())
+    with origen.connect() as lectura, destino.begin() as escritura:
+        for tabla in db.metadata.sorted_tables:
+            if tabla.name not in tablas_origen:
+                continue
+            columnas = [c for c in tabla.columns if c.name in
+                        {col["name"] for col in inspect(origen).get_columns(tabla.name)}]
+            resultado = lectura.execution_options(yield_per=tanda).execute(select(*columnas))
+            total = 0
+            for filas in resultado.partitions():
+                escritura.execute(tabla.insert(), [dict(f._mapping) for f in filas])
+                total += len(filas)
+            progreso(f"{tabla.name}: {total} filas")
+
+        for tabla in db.metadata.sorted_tables:
+            if "id" in tabla.c and tabla.c.id.autoincrement is not False and \
+                    isinstance(tabla.c.id.type, db.Integer):
+                ajustar_secuencia(escritura, tabla.name)
@@ -0,0 +1,122 @@
+import io
+import random
+from datetime import datetime, timedelta
+from PIL import Image
+from sqlalchemy import func, select
+from models import db, calcular_precios, producto_categoria, Categoria, FotoProducto, Lote, Producto, Venta
+from blobs import guardar_blob
+from search import indexado_en_bloque
+from stats import completar_costos_ventas, reconstruir_resumenes
+
+TANDA = 50000  # filas por INSERT (executemany)
+COLORES_FOTO = 12  # fotos distintas; el resto se deduplica en el almacén por contenido
+
+# Tamaños predefinidos para `flask generar-datos --escala` y benchmark.py
+ESCALAS = {
+    "chica": {"lotes": 10, "productos": 200, "categorias": 10, "ventas": 2000, "fotos": 1},
+    "mediana": {"lotes": 50, "productos": 2000, "categorias": 30, "ventas": 50000, "fotos": 1},
+    "grande": {"lotes": 200, "productos": 10000, "categorias": 50, "ventas": 500000, "fotos": 2},
+}
+
+
+def _foto(i):
+    """JPEG chico de un color, siempre el mismo para el mismo `i`."""
+    buffer = io.BytesIO()
+    color = ((i * 67) % 256, (i * 131) % 256, (i * 197) % 256)
+    Image.new("RGB", (64, 64), color).save(buffer, "JPEG")
+    buffer.seek(0)
+    return buffer
+
+
+def generar_catalogo(lotes, productos, categorias, fotos=0, carpeta_fotos=None):
+    """Inserta lotes, categorías, productos (con 1 a 3 categorías) y sus fotos.
+
+    Devuelve los ids de los productos creados.
+    """
+    hoy = datetime.utcnow()
+    lote_ids, categoria_ids = [], []
+    if lotes:
+        lote_ids = db.session.scalars(
+            Lote.__table__.insert().returning(Lote.__table__.c.id, sort_by_parameter_order=True),
+            [{"fecha": hoy - timedelta(days=random.randint(0, 365)),
+              "costo_envio": round(random.uniform(1000, 50000), 2)} for _ in range(lotes)],
+        ).all()
+    if categorias:
+        # sufijo para no chocar con categorías existentes (el nombre es único)
+        sufijo = (db.session.scalar(select(func.max(Categoria.id))) or 0) + 1
+        categoria_ids = db.session.scalars(
+            Categoria.__table__.insert().returning(Categoria.__table__.c.id, sort_by_parameter_order=True),
+            [{"nombre": f"Categoría {sufijo + i}"} for i in range(categorias)],
+        ).all()
+
+    filas = []
+    for i in range(productos):
+        compra = round(random.uniform(100, 10000), 2)
+        envio = round(random.uniform(0, 500), 2)
+        extra = round(random.choice([0, 0, random.uniform(0, 300)]), 2)
+        margen = random.choice([0.3, 0.4, 0.5, 0.6, 0.8])
+        costo, precio = calcular_precios(compra, envio, extra, margen)
+        filas.append({
+            "nombre": f"Producto {i} {random.choice(['Remera', 'Gorra', 'Taza', 'Buzo', 'Lata'])}",
+            "cantidad": random.randint(0, 200), "precio_compra": compra,
+            "costo_envio_unitario": envio, "costo_extra": extra, "margen": margen,
+            "costo_unitario": costo, "precio_sugerido": precio,
+            "lote_id": random.choice(lote_ids) if lote_ids else None,
+        })
+    tabla = Producto.__table__
+    producto_ids = []
+    with indexado_en_bloque():
+        for i in range(0, len(filas), TANDA):
+            producto_ids += db.session.scalars(
+                tabla.insert().returning(tabla.c.id, sort_by_parameter_order=True), filas[i:i + TANDA]).all()
+
+        if categoria_ids:
+            enlaces = [{"producto_id": pid, "categoria_id": cid} for pid in producto_ids
+                       for cid in random.sample(categoria_ids, min(len(categoria_ids), random.randint(1, 3)))]
+            for i in range(0, len(enlaces), TANDA):
+                db.session.execute(producto_categoria.insert(), enlaces[i:i + TANDA])
+
+    if fotos and carpeta_fotos and producto_ids:
+        nuevas = [{"producto_id": pid,
+                   "ruta": guardar_blob(carpeta_fotos, _foto(random.randrange(COLORES_FOTO)), "foto.jpg")}
+                  for pid in producto_ids for _ in range(min(fotos, 4))]
+        db.session.execute(FotoProducto.__table__.insert(), nuevas)
+
+    db.session.commit()
+    return producto_ids
+
+
+def generar_ventas(cantidad, producto_ids=None, dias=365):
+    """Inserta `cantidad` ventas repartidas en los últimos `dias` días.
+
+    No toca el stock ni los acumulados: llamar a reconstruir_resumenes() después.
+    """
+    if producto_ids is None:
+        producto_ids = db.session.scalars(select(Producto.id)).all()
+    if not producto_ids:
+        return 0
+    inicio = datetime.utcnow() - timedelta(days=dias)
+    restantes = cantidad
+    while restantes > 0:
+        n = min(TANDA, restantes)
+        db.session.execute(Venta.__table__.insert(), [{
+            "producto_id": random.choice(producto_ids),
+            "fecha": inicio + timedelta(seconds=random.randint(0, dias * 86400)),
+            "cantidad": random.randint(1, 3),
+            "precio_venta": round(random.uniform(150, 15000), 2),
+        } for _ in range(n)])
+        restantes -= n
+    completar_costos_ventas()
+    db.session.commit()
+    return cantidad
+
+
+def generar(lotes, productos, categorias, ventas, fotos=0, carpeta_fotos=None, semilla=None):
+    """Llena la base con datos sintéticos reproducibles (misma semilla, mismos datos)."""
+    if semilla is not None:
+        random.seed(semilla)
+    producto_ids = generar_catalogo(lotes, productos, categorias, fotos, carpeta_fotos)
+    generar_ventas(ventas, producto_ids)
+    reconstruir_resumenes()
+    return {"lotes": lotes, "productos": len(producto_ids), "categorias": categorias,
+            "ventas": ventas, "fotos": len(producto_ids) * min(fotos, 4) if carpeta_fotos else 0}
@@ -0,0 +1,99 @@
+import csv
+import io
+import json
+from collections import defaultdict
+from sqlalchemy import func, select
+from models import db, producto_categoria, Categoria, Lote, Producto, Venta
+
+LOTE_FILAS = 500  # filas que se traen de la base por vuelta
+
+
+def csv_stream(encabezado, filas):
+    """Generador de líneas CSV: la memoria no crece con la cantidad de filas."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(encabezado)
+    for fila in filas:
+        writer.writerow(fila)
+        if buffer.tell() > 16384:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def json_stream(encabezado, filas):
+    """Generador de JSON Lines (un objeto por línea) con las mismas filas."""
+    for fila in filas:
+        yield json.dumps(dict(zip(encabezado, fila)), ensure_ascii=False) + "\n"
+
+
+STOCK_COLUMNAS = ["id", "nombre", "cantidad", "precio_compra", "costo_envio_unitario",
+                  "costo_extra", "margen", "precio_sugerido", "lote_id"]
+
+
+def filas_stock():
+    stmt = select(
+        Producto.id, Producto.nombre, Producto.cantidad, Producto.precio_compra,
+        Producto.costo_envio_unitario, Producto.costo_extra, Producto.margen,
+        Producto.precio_sugerido, Producto.lote_id,
+    ).order_by(Producto.nombre, Producto.id).execution_options(yield_per=LOTE_FILAS)
+    for fila in db.session.execute(stmt):
+        yield list(fila)
+
+
+VENTAS_COLUMNAS = ["id", "fecha", "producto_id", "producto", "cantidad", "precio_venta", "costo_unitario"]
+
+
+def filas_ventas():
+    stmt = (
+        select(Venta.id, Venta.fecha, Venta.producto_id, func.coalesce(Producto.nombre, Venta.producto_nombre),
+               Venta.cantidad, Venta.precio_venta, Venta.costo_unitario)
+        .outerjoin(Producto, Venta.producto_id == Producto.id)
+        .order_by(Venta.fecha.desc(), Venta.id.desc())
+        .execution_options(yield_per=LOTE_FILAS)
+    )
+    for vid, fecha, producto_id, nombre, cantidad, precio, costo in db.session.execute(stmt):
+        yield [vid, fecha.isoformat() if fecha else "", producto_id, nombre or "", cantidad, precio, costo]
+
+
+LOTES_COLUMNAS = ["id", "fecha", "costo_envio"]
+
+
+def filas_lotes():
+    stmt = select(Lote.id, Lote.fecha, Lote.costo_envio) \
+        .order_by(Lote.id).execution_options(yield_per=LOTE_FILAS)
+    for lid, fecha, costo_envio in db.session.execute(stmt):
+        yield [lid, fecha.isoformat() if fecha else "", costo_envio]
+
+
+PRODUCTOS_COLUMNAS = ["id", "nombre", "cantidad", "precio_compra", "costo_envio_unitario",
+                      "costo_extra", "margen", "lote_id", "categorias"]
+SEPARADOR_CATEGORIAS = "|"
+
+
+def filas_productos():
+    """Productos con sus categorías; las categorías se buscan una vez por tanda."""
+    stmt = select(
+        Producto.id, Producto.nombre, Producto.cantidad, Producto.precio_compra,
+        Producto.costo_envio_unitario, Producto.costo_extra, Producto.margen, Producto.lote_id,
+    ).order_by(Producto.id).execution_options(yield_per=LOTE_FILAS)
+    for tanda in db.session.execute(stmt).partitions():
+        categorias = defaultdict(list)
+        enlaces = select(producto_categoria.c.producto_id, Categoria.nombre) \
+            .join(Categoria, Categoria.id == producto_categoria.c.categoria_id) \
+            .where(producto_categoria.c.producto_id.in_([fila[0] for fila in tanda])) \
+            .order_by(Categoria.nombre)
+        for pid, nombre in db.session.execute(enlaces):
+            categorias[pid].append(nombre)
+        for fila in tanda:
+            yield [*fila, SEPARADOR_CATEGORIAS.join(categorias[fila[0]])]
+
+
+# entidad -> (columnas, generador de filas)
+EXPORTACIONES = {
+    "lotes": (LOTES_COLUMNAS, filas_lotes),
+    "productos": (PRODUCTOS_COLUMNAS, filas_productos),
+    "ventas": (VENTAS_COLUMNAS, filas_ventas),
+    "stock": (STOCK_COLUMNAS, filas_stock),
+}
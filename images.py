@@ -0,0 +1,45 @@
+import os
+from PIL import Image, ImageOps
+
+# ancho máximo en px de cada variante; se guardan en WebP dentro de variantes/
+VARIANTES = {"thumb": 320, "medium": 960}
+CARPETA_VARIANTES = "variantes"
+CALIDAD = 80
+
+
+def ruta_variante(ruta, variante):
+    """Ruta relativa (dentro de uploads) de una variante de la foto."""
+    base, _ = os.path.splitext(ruta)
+    return f"{CARPETA_VARIANTES}/{base}_{variante}.webp"
+
+
+def generar_variantes(directorio, ruta, forzar=False):
+    """Genera las variantes de `ruta` y devuelve cuántas escribió."""
+    os.makedirs(os.path.join(directorio, CARPETA_VARIANTES), exist_ok=True)
+    pendientes = {
+        nombre: ancho for nombre, ancho in VARIANTES.items()
+        if forzar or not os.path.exists(os.path.join(directorio, ruta_variante(ruta, nombre)))
+    }
+    if not pendientes:
+        return 0
+
+    with Image.open(os.path.join(directorio, ruta)) as original:
+        imagen = ImageOps.exif_transpose(original)
+        if imagen.mode not in ("RGB", "RGBA"):
+            imagen = imagen.convert("RGBA" if "transparency" in imagen.info else "RGB")
+        for nombre, ancho in pendientes.items():
+            copia = imagen.copy()
+            copia.thumbnail((ancho, ancho * 4))
+            copia.save(os.path.join(directorio, ruta_variante(ruta, nombre)),
+                       "WEBP", quality=CALIDAD, method=4)
+    return len(pendientes)
+
+
+def eliminar_variantes(directorio, ruta):
+    for nombre in VARIANTES:
+        path = os.path.join(directorio, ruta_variante(ruta, nombre))
+        try:
+            if os.path.exists(path):
+                os.remove(path)
+        except Exception:
+            pass
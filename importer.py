@@ -0,0 +1,294 @@
+import csv
+import io
+import json
+from contextlib import nullcontext
+from datetime import datetime
+from sqlalchemy import insert, select
+from models import db, calcular_precios, producto_categoria, Categoria, Lote, Producto, Venta
+from export import SEPARADOR_CATEGORIAS
+from stats import acumular_venta, sumar_a_resumenes
+from cambios import registrar_cambios
+from database import ajustar_secuencia
+from search import indexado_en_bloque
+
+TANDA = 1000  # filas por INSERT (executemany)
+MAX_ERRORES = 200  # errores que se devuelven con detalle; el resto solo se cuenta
+ENTIDADES = ("lotes", "productos", "ventas")
+
+
+class ErrorFila(ValueError):
+    pass
+
+
+def leer_filas(stream, formato):
+    """Genera (línea, dict) desde un archivo binario CSV, JSON Lines o array JSON.
+
+    CSV y JSON Lines se leen de a una línea; un array JSON se carga entero.
+    """
+    texto = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    if formato == "csv":
+        lector = csv.DictReader(texto)
+        for fila in lector:
+            yield lector.line_num, fila
+        return
+
+    primera = texto.readline()
+    if primera.lstrip().startswith("["):
+        for n, fila in enumerate(json.loads(primera + texto.read()), 1):
+            yield n, fila
+        return
+    for n, linea in enumerate(_encadenar(primera, texto), 1):
+        if not linea.strip():
+            continue
+        try:
+            fila = json.loads(linea)
+        except json.JSONDecodeError as e:
+            fila = ErrorFila(f"JSON inválido: {e.msg}")
+        yield n, fila
+
+
+def _encadenar(primera, texto):
+    yield primera
+    yield from texto
+
+
+def formato_de(nombre_archivo):
+    return "csv" if nombre_archivo.lower().endswith(".csv") else "json"
+
+
+# -------------------- VALIDACIÓN --------------------
+def _vacio(valor):
+    return valor is None or (isinstance(valor, str) and not valor.strip())
+
+
+def _numero(fila, campo, tipo=float, defecto=None, minimo=None):
+    valor = fila.get(campo)
+    if _vacio(valor):
+        if defecto is None:
+            raise ErrorFila(f"falta '{campo}'")
+        return defecto
+    try:
+        numero = tipo(valor)
+    except (TypeError, ValueError):
+        raise ErrorFila(f"'{campo}' inválido: {valor!r}")
+    if minimo is not None and numero < minimo:
+        raise ErrorFila(f"'{campo}' debe ser >= {minimo}")
+    return numero
+
+
+def _fecha(fila, campo="fecha"):
+    valor = fila.get(campo)
+    if _vacio(valor):
+        return datetime.utcnow()
+    try:
+        return datetime.fromisoformat(str(valor).strip())
+    except ValueError:
+        raise ErrorFila(f"'{campo}' inválida: {valor!r} (usar AAAA-MM-DD)")
+
+
+class Importacion:
+    """Importa filas de una entidad en una sola transacción.
+
+    Las filas válidas se insertan en tandas con executemany; las inválidas se
+    informan con su número de línea. En modo estricto cualquier error
+    cancela toda la importación.
+    """
+
+    def __init__(self, entidad, estricto=False):
+        if entidad not in ENTIDADES:
+            raise ValueError(f"Entidad desconocida: {entidad}")
+        self.entidad = entidad
+        self.estricto = estricto
+        self.importadas = 0
+        self.errores = []
+        self.total_errores = 0
+        self.categorias_creadas = 0
+        self._pendientes = []
+        self._ids_explicitos = False
+
+    def _error(self, linea, mensaje):
+        self.total_errores += 1
+        if len(self.errores) < MAX_ERRORES:
+            self.errores.append((linea, mensaje))
+
+    def ejecutar(self, filas):
+        getattr(self, f"_preparar_{self.entidad}")()
+        validar = getattr(self, f"_validar_{self.entidad}")
+        with indexado_en_bloque() if self.entidad == "productos" else nullcontext():
+            for linea, fila in filas:
+                try:
+                    if isinstance(fila, Exception):
+                        raise fila
+                    if not isinstance(fila, dict):
+                        raise ErrorFila("se esperaba un objeto")
+                    self._pendientes.append(validar(fila))
+                except ErrorFila as e:
+                    self._error(linea, str(e))
+                    continue
+                if len(self._pendientes) >= TANDA:
+                    self._vaciar()
+            self._vaciar()
+            self._terminar()
+
+        if self.estricto and self.total_errores:
+            db.session.rollback()
+            self.importadas = self.categorias_creadas = 0
+        else:
+            db.session.commit()
+        return self
+
+    def _vaciar(self):
+        if self._pendientes:
+            getattr(self, f"_insertar_{self.entidad}")(self._pendientes)
+            self.importadas += len(self._pendientes)
+            self._pendientes = []
+
+    def _terminar(self):
+        if self.entidad == "ventas":
+            sumar_a_resumenes(self._acumulados)
+        if self._ids_explicitos:
+            # en PostgreSQL la secuencia no avanza con ids explícitos
+            tabla = Lote.__tablename__ if self.entidad == "lotes" else Producto.__tablename__
+            ajustar_secuencia(db.session.connection(), tabla)
+
+    def _id_explicito(self, fila, existentes, nombre):
+        """Id de la fila si trae uno; rechaza los que ya existen (la importación no actualiza)."""
+        if _vacio(fila.get("id")):
+            return None
+        nuevo = _numero(fila, "id", tipo=int, minimo=1)
+        if nuevo in existentes:
+            raise ErrorFila(f"{nombre} {nuevo} ya existe")
+        existentes.add(nuevo)
+        self._ids_explicitos = True
+        return nuevo
+
+    def resumen(self):
+        return {
+            "entidad": self.entidad,
+            "importadas": self.importadas,
+            "errores": self.total_errores,
+            "categorias_creadas": self.categorias_creadas,
+            "detalle_errores": self.errores,
+        }
+
+    # ---------- lotes ----------
+    def _preparar_lotes(self):
+        self._ids = set(db.session.scalars(select(Lote.id)))
+
+    def _validar_lotes(self, fila):
+        valores = {
+            "fecha": _fecha(fila),
+            "costo_envio": _numero(fila, "costo_envio", defecto=0.0, minimo=0),
+        }
+        lote_id = self._id_explicito(fila, self._ids, "el lote")
+        if lote_id is not None:
+            valores["id"] = lote_id
+        return valores
+
+    def _insertar_lotes(self, filas):
+        # executemany necesita las mismas columnas en todas las filas
+        con_id = [f for f in filas if "id" in f]
+        sin_id = [f for f in filas if "id" not in f]
+        for tanda in (con_id, sin_id):
+            if tanda:
+                db.session.execute(insert(Lote.__table__), tanda)
+
+    # ---------- productos ----------
+    def _preparar_productos(self):
+        self._lotes = set(db.session.scalars(select(Lote.id)))
+        self._ids = set(db.session.scalars(select(Producto.id)))
+        self._categorias = dict(db.session.execute(select(Categoria.nombre, Categoria.id)).all())
+
+    def _categoria_id(self, nombre):
+        if nombre not in self._categorias:
+            self._categorias[nombre] = db.session.execute(
+                insert(Categoria.__table__).values(nombre=nombre).returning(Categoria.__table__.c.id)
+            ).scalar_one()
+            self.categorias_creadas += 1
+        return self._categorias[nombre]
+
+    def _validar_productos(self, fila):
+        nombre = (fila.get("nombre") or "").strip()
+        if not nombre:
+            raise ErrorFila("falta 'nombre'")
+        lote_id = None
+        if not _vacio(fila.get("lote_id")):
+            lote_id = _numero(fila, "lote_id", tipo=int)
+            if lote_id not in self._lotes:
+                raise ErrorFila(f"el lote {lote_id} no existe")
+        categorias = fila.get("categorias") or []
+        if isinstance(categorias, str):
+            categorias = categorias.split(SEPARADOR_CATEGORIAS)
+        valores = {
+            "nombre": nombre,
+            "cantidad": _numero(fila, "cantidad", tipo=int, defecto=0, minimo=0),
+            "precio_compra": _numero(fila, "precio_compra", defecto=0.0, minimo=0),
+            "costo_envio_unitario": _numero(fila, "costo_envio_unitario", defecto=0.0, minimo=0),
+            "costo_extra": _numero(fila, "costo_extra", defecto=0.0, minimo=0),
+            "margen": _numero(fila, "margen", defecto=0.5),
+            "lote_id": lote_id,
+        }
+        producto_id = self._id_explicito(fila, self._ids, "el producto")
+        if producto_id is not None:
+            valores["id"] = producto_id
+        # los INSERT en bloque no pasan por el ORM: calcular acá los valores guardados
+        valores["costo_unitario"], valores["precio_sugerido"] = calcular_precios(
+            valores["precio_compra"], valores["costo_envio_unitario"], valores["costo_extra"], valores["margen"])
+        nombres = {str(c).strip() for c in categorias if str(c).strip()}
+        return valores, [self._categoria_id(c) for c in sorted(nombres)]
+
+    def _insertar_productos(self, filas):
+        tabla = Producto.__table__
+        con_id = [f for f in filas if "id" in f[0]]
+        sin_id = [f for f in filas if "id" not in f[0]]
+        ids, enlaces = [], []
+        for tanda in (con_id, sin_id):
+            if not tanda:
+                continue
+            nuevos = db.session.execute(
+                insert(tabla).returning(tabla.c.id, sort_by_parameter_order=True),
+                [valores for valores, _ in tanda],
+            ).scalars().all()
+            ids += nuevos
+            enlaces += [
+                {"producto_id": pid, "categoria_id": cid}
+                for pid, (_, categorias) in zip(nuevos, tanda) for cid in categorias
+            ]
+        if enlaces:
+            db.session.execute(producto_categoria.insert(), enlaces)
+        registrar_cambios(ids, "alta")
+
+    # ---------- ventas ----------
+    def _preparar_ventas(self):
+        # costo unitario por producto, para los acumulados del dashboard
+        self._costos = {pid: costo or 0 for pid, costo in
+                        db.session.execute(select(Producto.id, Producto.costo_unitario))}
+        self._acumulados = {}
+
+    def _validar_ventas(self, fila):
+        producto_id = _numero(fila, "producto_id", tipo=int)
+        if producto_id not in self._costos:
+            raise ErrorFila(f"el producto {producto_id} no existe")
+        valores = {
+            "producto_id": producto_id,
+            "fecha": _fecha(fila),
+            "cantidad": _numero(fila, "cantidad", tipo=int, minimo=1),
+            "precio_venta": _numero(fila, "precio_venta", minimo=0),
+        }
+        valores["costo_unitario"] = _numero(fila, "costo_unitario", defecto=self._costos[producto_id], minimo=0)
+        return valores
+
+    def _insertar_ventas(self, filas):
+        db.session.execute(insert(Venta.__table__), filas)
+        for v in filas:
+            acumular_venta(self._acumulados, v["producto_id"], v["fecha"], v["cantidad"],
+                           v["precio_venta"], v["costo_unitario"])
+
+
+def importar(entidad, stream, formato, estricto=False):
+    """Importa un archivo y devuelve el resumen con los errores por fila.
+
+    Las ventas importadas son historial: no descuentan stock, pero sí se
+    suman a los acumulados del dashboard.
+    """
+    return Importacion(entidad, estricto).ejecutar(leer_filas(stream, formato)).resumen()
@@ -0,0 +1,237 @@
+"""Instrumentación opcional de requests y SQL (INSTRUMENTACION=1).
+
+Por request mide la duración, la cantidad y el tiempo de las consultas, las
+sentencias más lentas y los posibles N+1 (la misma sentencia repetida con
+distintos parámetros). Lo publica en el header Server-Timing, en una línea
+de log JSON y en /metrics (formato Prometheus).
+
+Las métricas viven en memoria del proceso: con varios workers de gunicorn
+cada uno expone las suyas y Prometheus debe scrapear cada proceso.
+
+El perfilador por muestreo (PERFIL_RUTAS=dashboard,stock) toma la pila del
+hilo del request cada PERFIL_INTERVALO_MS y guarda un archivo .folded por
+request, listo para flamegraph.pl o speedscope.
+"""
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from flask import g, has_request_context, request, Response
+from sqlalchemy import event
+from models import db
+
+logger = logging.getLogger("stock.instrumentacion")
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+MAX_LENTAS = 5
+MAX_SQL_LOG = 300  # caracteres de cada sentencia en el log
+
+
+def _config(app):
+    env = os.environ.get
+    app.config.setdefault("INSTRUMENTACION", env("INSTRUMENTACION", "0") == "1")
+    app.config.setdefault("INSTRUMENTACION_LENTA_MS", float(env("INSTRUMENTACION_LENTA_MS", 100)))
+    app.config.setdefault("INSTRUMENTACION_N_MAS_1", int(env("INSTRUMENTACION_N_MAS_1", 5)))
+    app.config.setdefault("PERFIL_RUTAS", {r for r in env("PERFIL_RUTAS", "").split(",") if r})
+    app.config.setdefault("PERFIL_INTERVALO_MS", float(env("PERFIL_INTERVALO_MS", 5)))
+    app.config.setdefault("PERFIL_CARPETA", env("PERFIL_CARPETA", os.path.join(app.root_path, "perfiles")))
+
+
+# -------------------- MÉTRICAS --------------------
+class Metricas:
+    """Histograma de duración y contadores de SQL por endpoint, en memoria."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.buckets = defaultdict(lambda: [0] * len(BUCKETS))
+        self.suma = Counter()
+        self.cantidad = Counter()
+        self.consultas = Counter()
+        self.sql_segundos = Counter()
+        self.n_mas_1 = Counter()
+
+    def registrar(self, endpoint, metodo, estado, segundos, consultas, sql_segundos, n_mas_1):
+        clave = (endpoint, metodo, str(estado))
+        with self._lock:
+            fila = self.buckets[clave]
+            for i, limite in enumerate(BUCKETS):
+                if segundos <= limite:
+                    fila[i] += 1
+            self.suma[clave] += segundos
+            self.cantidad[clave] += 1
+            self.consultas[endpoint] += consultas
+            self.sql_segundos[endpoint] += sql_segundos
+            self.n_mas_1[endpoint] += n_mas_1
+
+    def prometheus(self):
+        """Texto en el formato de exposición de Prometheus."""
+        lineas = [
+            "# HELP stock_request_duracion_segundos Duración de los requests.",
+            "# TYPE stock_request_duracion_segundos histogram",
+        ]
+        with self._lock:
+            for (endpoint, metodo, estado), fila in sorted(self.buckets.items()):
+                etiquetas = f'endpoint="{_escapar(endpoint)}",metodo="{metodo}",estado="{estado}"'
+                for limite, valor in zip(BUCKETS, fila):
+                    lineas.append(f'stock_request_duracion_segundos_bucket{{{etiquetas},le="{limite}"}} {valor}')
+                total = self.cantidad[(endpoint, metodo, estado)]
+                lineas.append(f'stock_request_duracion_segundos_bucket{{{etiquetas},le="+Inf"}} {total}')
+                lineas.append(f"stock_request_duracion_segundos_sum{{{etiquetas}}} {self.suma[(endpoint, metodo, estado)]:.6f}")
+                lineas.append(f"stock_request_duracion_segundos_count{{{etiquetas}}} {total}")
+            for nombre, ayuda, contador in (
+                ("stock_sql_consultas_total", "Consultas SQL ejecutadas.", self.consultas),
+                ("stock_sql_segundos_total", "Tiempo total en SQL.", self.sql_segundos),
+                ("stock_sql_n_mas_1_total", "Patrones N+1 detectados.", self.n_mas_1),
+            ):
+                lineas += [f"# HELP {nombre} {ayuda}", f"# TYPE {nombre} counter"]
+                for endpoint, valor in sorted(contador.items()):
+                    lineas.append(f'{nombre}{{endpoint="{_escapar(endpoint)}"}} {valor:g}')
+        return "\n".join(lineas) + "\n"
+
+
+def _escapar(valor):
+    return str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+metricas = Metricas()
+
+
+# -------------------- SQL --------------------
+def _antes_de_sql(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("inicio_sql", []).append(time.perf_counter())
+
+
+def _despues_de_sql(conn, cursor, statement, parameters, context, executemany):
+    duracion = time.perf_counter() - conn.info["inicio_sql"].pop()
+    if not has_request_context() or "sql" not in g:
+        return
+    sql = g.sql
+    sql["consultas"] += 1
+    sql["segundos"] += duracion
+    sql["repeticiones"][statement] += 1
+    sql["lentas"].append((duracion, statement))
+    if len(sql["lentas"]) > MAX_LENTAS:
+        sql["lentas"].sort(reverse=True)
+        sql["lentas"].pop()
+
+
+# -------------------- PERFILADOR --------------------
+class Muestreador(threading.Thread):
+    """Toma la pila de un hilo cada `intervalo` segundos y cuenta las pilas iguales."""
+
+    def __init__(self, hilo_id, intervalo):
+        super().__init__(daemon=True)
+        self.hilo_id = hilo_id
+        self.intervalo = intervalo
+        self.muestras = Counter()
+        self._fin = threading.Event()
+
+    def run(self):
+        while not self._fin.wait(self.intervalo):
+            frame = sys._current_frames().get(self.hilo_id)
+            if frame is not None:
+                self.muestras[_pila(frame)] += 1
+
+    def detener(self):
+        self._fin.set()
+        self.join()
+        return self.muestras
+
+
+def _pila(frame):
+    partes = []
+    while frame is not None:
+        codigo = frame.f_code
+        partes.append(f"{codigo.co_name} ({os.path.basename(codigo.co_filename)}:{frame.f_lineno})")
+        frame = frame.f_back
+    return ";".join(reversed(partes))
+
+
+def _guardar_perfil(carpeta, endpoint, muestras):
+    """Escribe las pilas en formato "folded" (pila;pila;... cantidad)."""
+    os.makedirs(carpeta, exist_ok=True)
+    ruta = os.path.join(carpeta, f"{endpoint}-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{threading.get_ident()}.folded")
+    with open(ruta, "w", encoding="utf-8") as f:
+        for pila, cantidad in muestras.most_common():
+            f.write(f"{pila} {cantidad}\n")
+    return ruta
+
+
+# -------------------- FLASK --------------------
+def configurar_instrumentacion(app):
+    """Registra los hooks si INSTRUMENTACION está activa; si no, no hace nada."""
+    _config(app)
+    if not app.config["INSTRUMENTACION"]:
+        return
+
+    if not logger.handlers:
+        manejador = logging.StreamHandler()
+        manejador.setFormatter(logging.Formatter("%(message)s"))
+        logger.addHandler(manejador)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+
+    with app.app_context():
+        event.listen(db.engine, "before_cursor_execute", _antes_de_sql)
+        event.listen(db.engine, "after_cursor_execute", _despues_de_sql)
+
+    @app.before_request
+    def iniciar_medicion():
+        g.inicio_request = time.perf_counter()
+        g.sql = {"consultas": 0, "segundos": 0.0, "repeticiones": Counter(), "lentas": []}
+        if request.endpoint in app.config["PERFIL_RUTAS"]:
+            g.muestreador = Muestreador(threading.get_ident(), app.config["PERFIL_INTERVALO_MS"] / 1000)
+            g.muestreador.start()
+
+    @app.after_request
+    def publicar_medicion(response):
+        if "inicio_request" not in g:
+            return response
+        # en las respuestas en streaming no incluye la generación del cuerpo
+        total = time.perf_counter() - g.inicio_request
+        sql = g.pop("sql")
+        endpoint = request.endpoint or "desconocido"
+        umbral = app.config["INSTRUMENTACION_N_MAS_1"]
+        n_mas_1 = [(s, n) for s, n in sql["repeticiones"].most_common() if n >= umbral]
+        lenta_ms = app.config["INSTRUMENTACION_LENTA_MS"]
+
+        response.headers["Server-Timing"] = (
+            f'app;dur={total * 1000:.1f}, '
+            f'db;dur={sql["segundos"] * 1000:.1f};desc="{sql["consultas"]} consultas"'
+        )
+        metricas.registrar(endpoint, request.method, response.status_code, total,
+                           sql["consultas"], sql["segundos"], len(n_mas_1))
+
+        registro = {
+            "evento": "request",
+            "endpoint": endpoint,
+            "metodo": request.method,
+            "ruta": request.path,
+            "estado": response.status_code,
+            "ms": round(total * 1000, 2),
+            "consultas": sql["consultas"],
+            "sql_ms": round(sql["segundos"] * 1000, 2),
+            "lentas": [{"ms": round(d * 1000, 2), "sql": s[:MAX_SQL_LOG]}
+                       for d, s in sorted(sql["lentas"], reverse=True) if d * 1000 >= lenta_ms],
+            "n_mas_1": [{"veces": n, "sql": s[:MAX_SQL_LOG]} for s, n in n_mas_1],
+        }
+        muestreador = g.pop("muestreador", None)
+        if muestreador is not None:
+            registro["perfil"] = _guardar_perfil(app.config["PERFIL_CARPETA"], endpoint, muestreador.detener())
+        logger.log(logging.WARNING if n_mas_1 or registro["lentas"] else logging.INFO,
+                   json.dumps(registro, ensure_ascii=False))
+        return response
+
+    @app.teardown_request
+    def detener_muestreador(exc):
+        # si el request falló antes de after_request, no dejar el hilo corriendo
+        muestreador = g.pop("muestreador", None)
+        if muestreador is not None:
+            muestreador.detener()
+
+    @app.route("/metrics")
+    def metrics():
+        return Response(metricas.prometheus(), mimetype="text/plain; version=0.0.4")
@@ -0,0 +1,140 @@
+import json
+import threading
+from datetime import datetime, timedelta
+from models import db, Trabajo
+
+TAREAS = {}
+ESPERA_BASE = 5  # segundos; se duplica en cada reintento
+VENCIMIENTO = timedelta(minutes=10)  # en_curso más viejo que esto se da por abandonado
+
+
+def tarea(nombre):
+    """Registra la función que procesa los trabajos de tipo `nombre`."""
+    def decorador(func):
+        TAREAS[nombre] = func
+        return func
+    return decorador
+
+
+def encolar(tipo, **datos):
+    """Agrega el trabajo a la sesión actual.
+
+    Queda en la misma transacción que el resto de la request: si el commit
+    falla, el trabajo tampoco existe.
+    """
+    trabajo = Trabajo(tipo=tipo, datos=json.dumps(datos))
+    db.session.add(trabajo)
+    return trabajo
+
+
+def recuperar_abandonados():
+    """Vuelve a pendiente los trabajos que quedaron en curso tras un reinicio."""
+    limite = datetime.utcnow() - VENCIMIENTO
+    n = Trabajo.query.filter(Trabajo.estado == "en_curso", Trabajo.actualizado < limite) \
+        .update({"estado": "pendiente"}, synchronize_session=False)
+    db.session.commit()
+    return n
+
+
+def purgar(dias, con_errores=False):
+    """Borra los trabajos terminados hace más de `dias`; devuelve cuántos.
+
+    Los que fallaron (estado "error") se conservan salvo con `con_errores`,
+    para poder ver qué pasó.
+    """
+    limite = datetime.utcnow() - timedelta(days=dias)
+    estados = ["hecho", "error"] if con_errores else ["hecho"]
+    borrados = Trabajo.query.filter(Trabajo.estado.in_(estados), Trabajo.actualizado < limite) \
+        .delete(synchronize_session=False)
+    db.session.commit()
+    return borrados
+
+
+def _tomar_siguiente():
+    ahora = datetime.utcnow()
+    while True:
+        trabajo = Trabajo.query.filter(
+            Trabajo.estado == "pendiente", Trabajo.proximo_intento <= ahora,
+        ).order_by(Trabajo.id).first()
+        if trabajo is None:
+            return None
+        # UPDATE condicional: si otro worker lo tomó primero, probar con el siguiente
+        tomado = Trabajo.query.filter(Trabajo.id == trabajo.id, Trabajo.estado == "pendiente").update({
+            "estado": "en_curso",
+            "intentos": Trabajo.intentos + 1,
+            "actualizado": ahora,
+        }, synchronize_session=False)
+        db.session.commit()
+        if tomado:
+            db.session.refresh(trabajo)
+            return trabajo
+
+
+def procesar_uno():
+    """Ejecuta un trabajo pendiente. Devuelve False si no había ninguno."""
+    trabajo = _tomar_siguiente()
+    if trabajo is None:
+        return False
+    try:
+        TAREAS[trabajo.tipo](**json.loads(trabajo.datos))
+    except Exception as e:
+        db.session.rollback()
+        trabajo = db.session.get(Trabajo, trabajo.id)
+        trabajo.error = f"{type(e).__name__}: {e}"
+        if trabajo.intentos >= trabajo.max_intentos:
+            trabajo.estado = "error"
+        else:
+            trabajo.estado = "pendiente"
+            trabajo.proximo_intento = datetime.utcnow() + timedelta(seconds=ESPERA_BASE * 2 ** (trabajo.intentos - 1))
+    else:
+        trabajo.estado = "hecho"
+        trabajo.error = None
+    trabajo.actualizado = datetime.utcnow()
+    db.session.commit()
+    return True
+
+
+def procesar_pendientes():
+    """Procesa todo lo que esté listo para correr y devuelve cuántos trabajos corrió."""
+    n = 0
+    while procesar_uno():
+        n += 1
+    return n
+
+
+class Worker(threading.Thread):
+    """Hilo que consume la cola dentro del proceso web."""
+
+    def __init__(self, app, intervalo=1.0):
+        super().__init__(daemon=True, name="stockapp-worker")
+        self.app = app
+        self.intervalo = intervalo
+        self.detener = threading.Event()
+
+    def run(self):
+        while not self.detener.is_set():
+            try:
+                with self.app.app_context():
+                    hubo_trabajo = procesar_uno()
+            except Exception:
+                self.app.logger.exception("Error en el worker de trabajos")
+                hubo_trabajo = False
+            if not hubo_trabajo:
+                self.detener.wait(self.intervalo)
+
+
+_workers = []
+_lock = threading.Lock()
+
+
+def iniciar_workers(app, cantidad):
+    """Arranca `cantidad` hilos una sola vez por proceso."""
+    with _lock:
+        if _workers or cantidad <= 0:
+            return
+        with app.app_context():
+            recuperar_abandonados()
+        for _ in range(cantidad):
+            worker = Worker(app)
+            worker.start()
+            _workers.append(worker)
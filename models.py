@@ -1,20 +1,38 @@
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
+from decimal import Decimal, ROUND_HALF_UP
 
 db = SQLAlchemy()
 
+# Importes: NUMERIC en la base (exacto en PostgreSQL) pero float en Python,
+# para no mezclar Decimal con las cuentas que ya hace la app.
+Dinero = db.Numeric(12, 2, asdecimal=False)
+Total = db.Numeric(16, 2, asdecimal=False)
+Proporcion = db.Numeric(8, 4, asdecimal=False)
+AHORA = db.func.current_timestamp()
+
+
+def insert_upsert(tabla):
+    """INSERT con soporte de ON CONFLICT según el motor en uso."""
+    if db.session.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(tabla)
+
 # Tabla intermedia muchos-a-muchos
 producto_categoria = db.Table(
     "producto_categoria",
     db.Column("producto_id", db.Integer, db.ForeignKey("producto.id"), primary_key=True),
     db.Column("categoria_id", db.Integer, db.ForeignKey("categoria.id"), primary_key=True),
+    db.Index("ix_producto_categoria_categoria_id", "categoria_id"),  # categoría -> productos
 )
 
 
 class Lote(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    fecha = db.Column(db.DateTime, default=datetime.utcnow)
-    costo_envio = db.Column(db.Float, nullable=False, default=0.0)
+    fecha = db.Column(db.DateTime, default=datetime.utcnow, server_default=AHORA, index=True)
+    costo_envio = db.Column(Dinero, nullable=False, default=0.0, server_default="0")
 
     productos = db.relationship("Producto", back_populates="lote", cascade="all, delete-orphan")
 
@@ -38,17 +56,22 @@ class Categoria(db.Model):
 
 class Producto(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    nombre = db.Column(db.String(150), nullable=False)
-    cantidad = db.Column(db.Integer, default=0)
-    precio_compra = db.Column(db.Float, nullable=False, default=0.0)
-    costo_envio_unitario = db.Column(db.Float, default=0.0)
-    costo_extra = db.Column(db.Float, default=0.0)
-    margen = db.Column(db.Float, default=0.5)
-    lote_id = db.Column(db.Integer, db.ForeignKey("lote.id"), nullable=True)
+    nombre = db.Column(db.String(150), nullable=False, index=True)
+    cantidad = db.Column(db.Integer, default=0, server_default="0", index=True)
+    precio_compra = db.Column(Dinero, nullable=False, default=0.0, server_default="0")
+    costo_envio_unitario = db.Column(Dinero, default=0.0, server_default="0")
+    costo_extra = db.Column(Dinero, default=0.0, server_default="0")
+    margen = db.Column(Proporcion, default=0.5, server_default="0.5")
+    lote_id = db.Column(db.Integer, db.ForeignKey("lote.id"), nullable=True, index=True)
+    # Guardados para poder ordenar, filtrar y sumar en SQL; se recalculan al
+    # guardar el producto (ver _guardar_precios) y en precios.py para los UPDATE en bloque.
+    costo_unitario = db.Column(Dinero)
+    precio_sugerido = db.Column(Dinero, index=True)
 
     lote = db.relationship("Lote", back_populates="productos")
     fotos = db.relationship("FotoProducto", back_populates="producto", cascade="all, delete-orphan")
-    ventas = db.relationship("Venta", back_populates="producto")
+    # al borrar el producto las ventas quedan, con producto_id en NULL (ver bajas.py)
+    ventas = db.relationship("Venta", back_populates="producto", passive_deletes=True)
 
     categorias = db.relationship(
         "Categoria",
@@ -56,11 +79,10 @@ class Producto(db.Model):
         back_populates="productos"
     )
 
-    @property
-    def precio_sugerido(self):
-        """Calcula siempre el precio sugerido en base a costos + margen."""
-        costo_total = (self.precio_compra or 0) + (self.costo_envio_unitario or 0) + (self.costo_extra or 0)
-        return round(costo_total * (1 + (self.margen or 0)), 2)
+    def calcular_precios(self):
+        """Actualiza costo_unitario y precio_sugerido según costos + margen."""
+        self.costo_unitario, self.precio_sugerido = calcular_precios(
+            self.precio_compra, self.costo_envio_unitario, self.costo_extra, self.margen)
 
     def add_foto(self, foto):
         """Agrega una foto si el producto tiene menos de 4."""
@@ -72,6 +94,52 @@ class Producto(db.Model):
         return f"<Producto {self.nombre} (Stock: {self.cantidad})>"
 
 
+def centavos(valor):
+    """Redondea a 2 decimales como ROUND() en SQL: mitades hacia afuera.
+
+    round() de Python redondea el float binario (91.395 -> 91.39) y no
+    coincidiría con lo que guardan los UPDATE de precios.py.
+    """
+    return float(Decimal(str(valor or 0)).quantize(Decimal("0.01"), ROUND_HALF_UP))
+
+
+def calcular_precios(precio_compra, costo_envio_unitario, costo_extra, margen):
+    """(costo unitario, precio sugerido); la misma cuenta que precios.precio_sql()."""
+    costo = sum(Decimal(str(v or 0)) for v in (precio_compra, costo_envio_unitario, costo_extra))
+    return centavos(costo), centavos(costo * (1 + Decimal(str(margen or 0))))
+
+
+@db.event.listens_for(Producto, "before_insert")
+def _completar_costos(mapper, connection, producto):
+    # los default de columna se aplican después de este evento: sin esto un
+    # producto nuevo sin margen guardaría el precio con margen 0 y no 0.5
+    for columna in ("precio_compra", "costo_envio_unitario", "costo_extra", "margen"):
+        if getattr(producto, columna) is None:
+            setattr(producto, columna, mapper.columns[columna].default.arg)
+
+
+@db.event.listens_for(Producto, "before_insert")
+@db.event.listens_for(Producto, "before_update")
+def _guardar_precios(mapper, connection, producto):
+    producto.calcular_precios()
+
+
+class Blob(db.Model):
+    """Archivo subido, guardado una sola vez con nombre por contenido.
+
+    `referencias` cuenta las FotoProducto que lo usan; al llegar a cero el
+    archivo se borra en segundo plano.
+    """
+    ruta = db.Column(db.String(300), primary_key=True)
+    hash = db.Column(db.String(64), nullable=False, index=True)
+    tamano = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    referencias = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    creado = db.Column(db.DateTime, default=datetime.utcnow, server_default=AHORA)
+
+    def __repr__(self):
+        return f"<Blob {self.ruta} ({self.referencias} refs)>"
+
+
 class FotoProducto(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     ruta = db.Column(db.String(300), nullable=False)
@@ -85,12 +153,70 @@ class FotoProducto(db.Model):
 
 class Venta(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    fecha = db.Column(db.DateTime, default=datetime.utcnow)
-    producto_id = db.Column(db.Integer, db.ForeignKey("producto.id"), nullable=False)  # 🔒 siempre debe tener producto
+    fecha = db.Column(db.DateTime, default=datetime.utcnow, server_default=AHORA, index=True)
+    # NULL si el producto se borró: la venta es historia y se conserva
+    producto_id = db.Column(db.Integer, db.ForeignKey("producto.id", ondelete="SET NULL"), index=True)
+    producto_nombre = db.Column(db.String(150))  # se guarda al borrar el producto
     cantidad = db.Column(db.Integer, nullable=False)
-    precio_venta = db.Column(db.Float, nullable=False)
+    precio_venta = db.Column(Dinero, nullable=False)
+    # costo del producto al momento de la venta: la ganancia histórica no cambia al repreciar
+    costo_unitario = db.Column(Dinero)
 
     producto = db.relationship("Producto", back_populates="ventas")
 
     def __repr__(self):
-        return f"<Venta {self.id} - Producto {self.producto_id} - Cantidad {self.cantidad}>"
\ No newline at end of file
+        return f"<Venta {self.id} - Producto {self.producto_id} - Cantidad {self.cantidad}>"
+
+class ResumenVenta(db.Model):
+    """Acumulado de ventas por producto y período ("dia" o "mes")."""
+    __tablename__ = "resumen_venta"
+    __table_args__ = (
+        db.UniqueConstraint("periodo", "fecha", "producto_id", name="uq_resumen_periodo"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    periodo = db.Column(db.String(3), nullable=False)  # "dia" | "mes"
+    fecha = db.Column(db.Date, nullable=False)  # inicio del período
+    producto_id = db.Column(db.Integer, db.ForeignKey("producto.id", ondelete="SET NULL"))  # NULL: producto borrado
+    unidades = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    ingresos = db.Column(Total, nullable=False, default=0.0, server_default="0")
+    costo = db.Column(Total, nullable=False, default=0.0, server_default="0")
+    ganancia = db.Column(Total, nullable=False, default=0.0, server_default="0")
+
+    def __repr__(self):
+        return f"<ResumenVenta {self.periodo} {self.fecha} - Producto {self.producto_id}>"
+
+
+class CambioStock(db.Model):
+    """Estado de un producto después de cada cambio de stock o precio.
+
+    Los consumidores externos leen desde el último id que vieron; cada fila
+    trae el estado completo, así aplicarla dos veces no cambia nada.
+    """
+    __tablename__ = "cambio_stock"
+    id = db.Column(db.Integer, primary_key=True)
+    producto_id = db.Column(db.Integer, nullable=False, index=True)  # sin FK: sobrevive a la baja
+    tipo = db.Column(db.String(20), nullable=False)  # alta | modificacion | venta | baja
+    cantidad = db.Column(db.Integer)  # None en las bajas
+    precio_sugerido = db.Column(Dinero)
+    fecha = db.Column(db.DateTime, default=datetime.utcnow, server_default=AHORA, index=True)
+
+    def __repr__(self):
+        return f"<CambioStock {self.id} {self.tipo} - Producto {self.producto_id}>"
+
+
+class Trabajo(db.Model):
+    """Tarea en segundo plano (procesar fotos, borrar archivos...)."""
+    id = db.Column(db.Integer, primary_key=True)
+    tipo = db.Column(db.String(50), nullable=False)
+    datos = db.Column(db.Text, nullable=False, default="{}")  # JSON con los argumentos
+    estado = db.Column(db.String(20), nullable=False, default="pendiente", server_default="pendiente", index=True)  # pendiente | en_curso | hecho | error
+    intentos = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    max_intentos = db.Column(db.Integer, nullable=False, default=5, server_default="5")
+    proximo_intento = db.Column(db.DateTime, default=datetime.utcnow, server_default=AHORA)
+    error = db.Column(db.Text)
+    creado = db.Column(db.DateTime, default=datetime.utcnow, server_default=AHORA)
+    actualizado = db.Column(db.DateTime, default=datetime.utcnow, server_default=AHORA)
+
+    def __repr__(self):
+        return f"<Trabajo {self.id} {self.tipo} ({self.estado})>"
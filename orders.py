@@ -0,0 +1,90 @@
+from datetime import datetime
+from sqlalchemy import select, update
+from models import db, Producto, Venta
+from stats import acumular_venta, sumar_a_resumenes
+from cambios import registrar_cambios
+
+
+class StockInsuficiente(Exception):
+    def __init__(self, producto_id, nombre, disponible):
+        super().__init__(f"No hay suficiente stock de '{nombre}'. Disponible: {disponible}")
+        self.producto_id = producto_id
+        self.disponible = disponible
+
+
+class LineaInvalida(ValueError):
+    pass
+
+
+class ProductoNoEncontrado(LineaInvalida):
+    pass
+
+
+def descontar_stock(producto_id, cantidad):
+    """Descuenta stock solo si alcanza, en un único UPDATE condicional.
+
+    Devuelve la cantidad que quedó, o None si no había stock suficiente.
+    Como la verificación y la resta ocurren en la misma sentencia, dos
+    ventas concurrentes nunca pueden dejar el stock en negativo.
+    """
+    return db.session.execute(
+        update(Producto)
+        .where(Producto.id == producto_id, Producto.cantidad >= cantidad)
+        .values(cantidad=Producto.cantidad - cantidad)
+        .returning(Producto.cantidad)
+        .execution_options(synchronize_session=False)
+    ).scalar_one_or_none()
+
+
+def registrar_pedido(lineas):
+    """Registra varias ventas en la transacción actual.
+
+    `lineas` es una lista de (producto_id, cantidad, precio_venta). Si alguna
+    no tiene stock se lanza StockInsuficiente y el llamador debe hacer
+    rollback: no queda ninguna línea a medias. Devuelve los ids de los
+    productos que quedaron sin stock.
+    """
+    if not lineas:
+        raise LineaInvalida("El pedido no tiene líneas")
+    for producto_id, cantidad, precio_venta in lineas:
+        if cantidad < 1:
+            raise LineaInvalida("La cantidad debe ser al menos 1")
+        if precio_venta < 0:
+            raise LineaInvalida("El precio no puede ser negativo")
+
+    ids = {producto_id for producto_id, _, _ in lineas}
+    productos = {p.id: p for p in db.session.scalars(select(Producto).where(Producto.id.in_(ids)))}
+    faltantes = ids - productos.keys()
+    if faltantes:
+        raise ProductoNoEncontrado(f"Producto no encontrado: {min(faltantes)}")
+
+    # un solo descuento por producto aunque aparezca en varias líneas: así el
+    # "Disponible" del error es el stock real y no lo que dejó la línea anterior
+    pedidas = {}
+    for producto_id, cantidad, _ in lineas:
+        pedidas[producto_id] = pedidas.get(producto_id, 0) + cantidad
+    agotados = set()
+    for producto_id, cantidad in pedidas.items():
+        restante = descontar_stock(producto_id, cantidad)
+        if restante is None:
+            disponible = db.session.scalar(select(Producto.cantidad).where(Producto.id == producto_id))
+            raise StockInsuficiente(producto_id, productos[producto_id].nombre, disponible)
+        if restante == 0:
+            agotados.add(producto_id)
+
+    ahora = datetime.utcnow()
+    ventas = []
+    acumulados = {}
+    for producto_id, cantidad, precio_venta in lineas:
+        producto = productos[producto_id]
+        ventas.append({"producto_id": producto_id, "cantidad": cantidad, "precio_venta": precio_venta,
+                       "costo_unitario": producto.costo_unitario or 0, "fecha": ahora})
+        acumular_venta(acumulados, producto_id, ahora, cantidad, precio_venta, producto.costo_unitario or 0)
+
+    db.session.execute(Venta.__table__.insert(), ventas)
+    sumar_a_resumenes(acumulados)
+    registrar_cambios(productos.keys(), "venta")
+    # el UPDATE no pasa por el ORM: refrescar el stock de los objetos cargados
+    for producto in productos.values():
+        db.session.expire(producto, ["cantidad"])
+    return agotados
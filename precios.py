@@ -0,0 +1,84 @@
+from sqlalchemy import cast, func, literal, or_, select, update
+from models import db, centavos, Dinero, Proporcion, Producto, Venta
+
+TOLERANCIA = 0.005  # diferencias de redondeo que no cuentan como inconsistencia
+
+
+def costo_sql(envio=Producto.costo_envio_unitario):
+    """Expresión SQL del costo unitario (compra + envío + extra)."""
+    return (
+        func.coalesce(Producto.precio_compra, 0) +
+        func.coalesce(envio, 0) +
+        func.coalesce(Producto.costo_extra, 0)
+    )
+
+
+def precio_sql(costo, margen=Producto.margen):
+    return func.round(costo * (1 + func.coalesce(margen, 0)), 2)
+
+
+def recalcular_precios(ids=None):
+    """Recalcula costo_unitario y precio_sugerido en un solo UPDATE.
+
+    Sin `ids` recalcula todos los productos. Devuelve las filas tocadas.
+    """
+    stmt = update(Producto).values(
+        costo_unitario=func.round(costo_sql(), 2),
+        precio_sugerido=precio_sql(costo_sql()),
+    ).execution_options(synchronize_session=False)
+    if ids is not None:
+        stmt = stmt.where(Producto.id.in_(ids))
+    return db.session.execute(stmt).rowcount
+
+
+def unidades_del_lote(lote_id):
+    """Unidades compradas en el lote: el stock actual más lo ya vendido."""
+    en_stock = db.session.scalar(
+        select(func.coalesce(func.sum(Producto.cantidad), 0)).where(Producto.lote_id == lote_id))
+    vendidas = db.session.scalar(
+        select(func.coalesce(func.sum(Venta.cantidad), 0))
+        .join(Producto, Venta.producto_id == Producto.id)
+        .where(Producto.lote_id == lote_id))
+    return en_stock + vendidas
+
+
+def repreciar_lote(lote_id, costo_envio, margen=None):
+    """Reparte el envío del lote entre sus unidades y, si se indica, aplica un margen nuevo.
+
+    Todos los productos del lote se actualizan en un único UPDATE (envío
+    unitario, margen, costo y precio guardados). Devuelve los ids tocados.
+    """
+    unidades = unidades_del_lote(lote_id)
+    # cast: en PostgreSQL round(x, 2) necesita NUMERIC, no un float suelto
+    envio = cast(literal(centavos(costo_envio / unidades) if unidades else 0.0), Dinero)
+    valores = {"costo_envio_unitario": envio}
+    nuevo_margen = Producto.margen
+    if margen is not None:
+        valores["margen"] = nuevo_margen = cast(literal(margen), Proporcion)
+    # en el SET las columnas valen lo de antes del UPDATE: usar los valores nuevos
+    valores["costo_unitario"] = func.round(costo_sql(envio), 2)
+    valores["precio_sugerido"] = precio_sql(costo_sql(envio), nuevo_margen)
+    return db.session.scalars(
+        update(Producto).where(Producto.lote_id == lote_id).values(valores)
+        .returning(Producto.id).execution_options(synchronize_session=False)
+    ).all()
+
+
+def verificar_precios(corregir=False):
+    """Ids de productos cuyo costo o precio guardado no coincide con el calculado.
+
+    Con `corregir=True` además los recalcula.
+    """
+    def distinto(guardado, esperado):
+        return or_(guardado.is_(None), func.abs(guardado - esperado) > TOLERANCIA)
+
+    inconsistentes = db.session.scalars(
+        select(Producto.id).where(or_(
+            distinto(Producto.costo_unitario, costo_sql()),
+            distinto(Producto.precio_sugerido, precio_sql(costo_sql())),
+        )).order_by(Producto.id)
+    ).all()
+    if corregir and inconsistentes:
+        recalcular_precios(inconsistentes)
+        db.session.commit()
+    return inconsistentes
@@ -0,0 +1,117 @@
+import base64
+import json
+from datetime import datetime
+from decimal import Decimal
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import joinedload, selectinload, subqueryload
+from models import Producto, Categoria, Lote, Venta
+
+POR_PAGINA = 50
+
+# Perfiles de carga: cada vista trae de una vez exactamente las relaciones
+# que su template recorre, así la cantidad de consultas no depende de las filas.
+CON_FOTOS = (selectinload(Producto.fotos),)
+CATALOGO = (selectinload(Producto.fotos), selectinload(Producto.categorias))
+# subqueryload: una página de lotes puede traer miles de productos y
+# selectinload los pide en tandas de 500 (una consulta más por tanda)
+LOTES = (subqueryload(Lote.productos).subqueryload(Producto.fotos),)
+VENTAS = (joinedload(Venta.producto),)
+
+
+def productos_query(*opciones):
+    return Producto.query.options(*opciones).order_by(Producto.nombre, Producto.id)
+
+
+def productos_listado():
+    """Productos con sus fotos (productos.html)."""
+    return productos_query(*CON_FOTOS)
+
+
+def productos_catalogo(categoria_id=None):
+    """Productos con fotos y categorías, opcionalmente de una sola categoría."""
+    query = productos_query(*CATALOGO)
+    if categoria_id:
+        query = query.filter(Producto.categorias.any(Categoria.id == categoria_id))
+    return query
+
+
+def lotes_listado():
+    """Lotes con sus productos y las fotos de cada producto (lotes.html)."""
+    return Lote.query.options(*LOTES).order_by(Lote.fecha.desc())
+
+
+def ventas_historial():
+    """Ventas con el producto ya cargado (ventas.html)."""
+    return Venta.query.options(*VENTAS).order_by(Venta.fecha.desc(), Venta.id.desc())
+
+
+# -------------------- PAGINACIÓN POR CLAVE --------------------
+CLAVE_PRODUCTOS = (Producto.nombre, Producto.id)
+CLAVE_VENTAS = (Venta.fecha, Venta.id)
+CLAVE_LOTES = (Lote.fecha, Lote.id)
+
+
+def codificar_cursor(valores):
+    valores = [v.isoformat() if isinstance(v, datetime) else v for v in valores]
+    return base64.urlsafe_b64encode(json.dumps(valores).encode()).decode()
+
+
+def decodificar_cursor(cursor, columnas):
+    """Devuelve los valores del cursor o lanza ValueError si no es válido."""
+    try:
+        valores = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except Exception:
+        raise ValueError("Cursor inválido")
+    if not isinstance(valores, list) or len(valores) != len(columnas):
+        raise ValueError("Cursor inválido")
+    return [_valor_cursor(col, v) for col, v in zip(columnas, valores)]
+
+
+def _valor_cursor(columna, valor):
+    """El valor tal como lo escribió codificar_cursor() para esa columna.
+
+    Un cursor armado a mano con otro tipo (un objeto, un texto donde va un
+    entero) llegaría hasta el driver y terminaría en un 500.
+    """
+    if valor is None and columna.nullable:
+        return None
+    tipo = columna.type.python_type
+    if tipo is datetime:
+        if not isinstance(valor, str):
+            raise ValueError("Cursor inválido")
+        return datetime.fromisoformat(valor)  # ValueError si no es una fecha ISO
+    if tipo is int:
+        valido = isinstance(valor, int)
+    elif tipo in (float, Decimal):
+        valido = isinstance(valor, (int, float))
+    else:
+        valido = isinstance(valor, tipo)
+    if not valido or isinstance(valor, bool):
+        raise ValueError("Cursor inválido")
+    return valor
+
+
+def _despues_de(columnas, valores, descendente):
+    """(a, b) > (x, y) expandido a OR/AND para que funcione en cualquier motor."""
+    condiciones = []
+    for i, (col, valor) in enumerate(zip(columnas, valores)):
+        iguales = [c == v for c, v in zip(columnas[:i], valores[:i])]
+        condiciones.append(and_(*iguales, col < valor if descendente else col > valor))
+    return or_(*condiciones)
+
+
+def paginar(query, columnas, cursor=None, por_pagina=POR_PAGINA, descendente=False):
+    """Pagina `query` por las `columnas` (que juntas deben ser únicas).
+
+    Devuelve (filas, cursor de la página siguiente o None).
+    """
+    query = query.order_by(None).order_by(
+        *[c.desc() if descendente else c.asc() for c in columnas])
+    if cursor:
+        query = query.filter(_despues_de(columnas, decodificar_cursor(cursor, columnas), descendente))
+
+    filas = query.limit(por_pagina + 1).all()
+    if len(filas) <= por_pagina:
+        return filas, None
+    filas = filas[:por_pagina]
+    return filas, codificar_cursor([getattr(filas[-1], c.key) for c in columnas])
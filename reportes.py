@@ -0,0 +1,182 @@
+from datetime import date, timedelta
+import numpy as np
+from sqlalchemy import func, select
+from models import db, producto_categoria, Categoria, Lote, Producto, ResumenVenta
+from stats import filtrar_fechas, periodo_para
+
+DIAS_VELOCIDAD = 30  # ventana para estimar las ventas diarias (días de stock)
+
+# Las ventas salen de los acumulados (ResumenVenta), así el costo del reporte
+# depende de productos x períodos con ventas y no de la cantidad de ventas.
+# Cada entidad se trae en una sola consulta, por columnas, y las métricas se
+# calculan sobre arrays de NumPy sin recorrer objetos.
+
+
+def _columnas(stmt, *tipos):
+    """Ejecuta `stmt` y devuelve un array por columna."""
+    filas = db.session.execute(stmt).all()
+    if not filas:
+        return [np.array([], dtype=t) for t in tipos]
+    return [np.array(col, dtype=t) for col, t in zip(zip(*filas), tipos)]
+
+
+def _dividir(a, b):
+    """a / b elemento a elemento; NaN donde b es 0."""
+    resultado = np.full(len(a), np.nan)
+    np.divide(a, b, out=resultado, where=b != 0)
+    return resultado
+
+
+def _posiciones(ids_ordenados, buscados):
+    """Índice de cada `buscados` en `ids_ordenados` y máscara de los encontrados."""
+    pos = np.searchsorted(ids_ordenados, buscados)
+    pos = np.minimum(pos, max(len(ids_ordenados) - 1, 0))
+    encontrados = ids_ordenados[pos] == buscados if len(ids_ordenados) else np.zeros(len(buscados), bool)
+    return pos, encontrados
+
+
+def _sumar_por(grupo, n, **valores):
+    """Suma cada array de `valores` agrupando por el índice `grupo` (0..n-1)."""
+    sumas = {}
+    for k, v in valores.items():
+        suma = np.bincount(grupo, weights=v, minlength=n)
+        sumas[k] = suma.astype(np.int64) if v.dtype.kind == "i" else suma
+    return sumas
+
+
+def _filas(columnas, orden=None):
+    """Arrays -> lista de filas, con NaN como None y montos redondeados."""
+    listas = []
+    for col in columnas:
+        if col.dtype.kind == "f":
+            col = np.round(col, 2)
+            listas.append([None if x != x else x for x in col.tolist()])
+        else:
+            listas.append(col.tolist())
+    filas = list(zip(*listas))
+    return [filas[i] for i in orden] if orden is not None else filas
+
+
+def _ventas_por_producto(desde, hasta):
+    """(producto_id, unidades, ingresos, costo) dentro del rango, por producto.
+
+    Usa los acumulados mensuales si el rango no corta meses: muchas menos filas.
+    """
+    stmt = filtrar_fechas(
+        select(ResumenVenta.producto_id, func.sum(ResumenVenta.unidades),
+               func.sum(ResumenVenta.ingresos), func.sum(ResumenVenta.costo))
+        .where(ResumenVenta.periodo == periodo_para(desde, hasta), ResumenVenta.producto_id.is_not(None)),
+        desde, hasta,
+    ).group_by(ResumenVenta.producto_id).order_by(ResumenVenta.producto_id)
+    return _columnas(stmt, np.int64, np.int64, np.float64, np.float64)
+
+
+def _unidades_recientes(dias):
+    """(producto_id, unidades) vendidas en los últimos `dias` días."""
+    stmt = (
+        select(ResumenVenta.producto_id, func.sum(ResumenVenta.unidades))
+        .where(ResumenVenta.periodo == "dia", ResumenVenta.producto_id.is_not(None),
+               ResumenVenta.fecha >= date.today() - timedelta(days=dias))
+        .group_by(ResumenVenta.producto_id).order_by(ResumenVenta.producto_id)
+    )
+    return _columnas(stmt, np.int64, np.int64)
+
+
+def calcular_reporte(desde=None, hasta=None, dias=DIAS_VELOCIDAD):
+    """Valuación del inventario y rentabilidad por producto, lote y categoría.
+
+    La ganancia respeta el rango [desde, hasta); el stock, la valuación y los
+    días de stock son siempre el estado actual.
+    """
+    # productos
+    pid, nombre, lote_id, cantidad, costo_u, precio_u = _columnas(
+        select(Producto.id, Producto.nombre, func.coalesce(Producto.lote_id, 0),
+               func.coalesce(Producto.cantidad, 0), func.coalesce(Producto.costo_unitario, 0),
+               func.coalesce(Producto.precio_sugerido, 0)).order_by(Producto.id),
+        np.int64, object, np.int64, np.int64, np.float64, np.float64)
+    n = len(pid)
+
+    # ventas, alineadas con el array de productos
+    vendidas, recientes = np.zeros(n, np.int64), np.zeros(n, np.int64)
+    ingresos, costo = np.zeros(n), np.zeros(n)
+    v_pid, v_unid, v_ing, v_costo = _ventas_por_producto(desde, hasta)
+    pos, ok = _posiciones(pid, v_pid)
+    vendidas[pos[ok]], ingresos[pos[ok]], costo[pos[ok]] = v_unid[ok], v_ing[ok], v_costo[ok]
+    r_pid, r_unid = _unidades_recientes(dias)
+    pos, ok = _posiciones(pid, r_pid)
+    recientes[pos[ok]] = r_unid[ok]
+
+    ganancia = ingresos - costo
+    valor_costo = cantidad * costo_u
+    valor_venta = cantidad * precio_u
+    sell_through = _dividir(vendidas, vendidas + cantidad)
+    dias_stock = _dividir(cantidad, recientes / dias)
+    dias_stock[cantidad == 0] = 0.0
+
+    orden = np.argsort(-ganancia, kind="stable")
+    productos = _filas([pid, nombre, cantidad, valor_costo, valor_venta, vendidas, ingresos,
+                        ganancia, sell_through * 100, dias_stock], orden)
+
+    # lotes (posición 0 = productos sin lote)
+    l_id, l_fecha, l_envio = _columnas(
+        select(Lote.id, Lote.fecha, func.coalesce(Lote.costo_envio, 0)).order_by(Lote.id),
+        np.int64, object, np.float64)
+    l_pos, l_ok = _posiciones(l_id, lote_id)
+    grupo = np.where(l_ok & (lote_id != 0), l_pos + 1, 0)
+    por_lote = _sumar_por(grupo, len(l_id) + 1, cantidad=cantidad, valor_costo=valor_costo,
+                          valor_venta=valor_venta, vendidas=vendidas, ingresos=ingresos,
+                          ganancia=ganancia)
+    lotes = _filas([
+        np.concatenate([[0], l_id]),
+        np.array([None] + [f.date().isoformat() if f else None for f in l_fecha], dtype=object),
+        np.concatenate([[0.0], l_envio]),
+        por_lote["cantidad"], por_lote["valor_costo"], por_lote["valor_venta"], por_lote["vendidas"],
+        por_lote["ingresos"], por_lote["ganancia"],
+        _dividir(por_lote["vendidas"], por_lote["vendidas"] + por_lote["cantidad"]) * 100,
+    ])
+    if not por_lote["cantidad"][0] and not por_lote["vendidas"][0]:
+        lotes = lotes[1:]  # no hay productos sin lote
+
+    # categorías: un producto con varias categorías suma en cada una
+    c_id, c_nombre = _columnas(select(Categoria.id, Categoria.nombre).order_by(Categoria.id),
+                               np.int64, object)
+    e_pid, e_cid = _columnas(select(producto_categoria.c.producto_id, producto_categoria.c.categoria_id),
+                             np.int64, np.int64)
+    e_ppos, e_pok = _posiciones(pid, e_pid)
+    e_cpos, e_cok = _posiciones(c_id, e_cid)
+    ok = e_pok & e_cok
+    e_ppos, e_cpos = e_ppos[ok], e_cpos[ok]
+    por_cat = _sumar_por(e_cpos, len(c_id), cantidad=cantidad[e_ppos], valor_costo=valor_costo[e_ppos],
+                         valor_venta=valor_venta[e_ppos], vendidas=vendidas[e_ppos],
+                         ingresos=ingresos[e_ppos], ganancia=ganancia[e_ppos])
+    categorias = _filas([
+        c_id, c_nombre, por_cat["cantidad"], por_cat["valor_costo"], por_cat["valor_venta"],
+        por_cat["vendidas"], por_cat["ingresos"], por_cat["ganancia"],
+        _dividir(por_cat["vendidas"], por_cat["vendidas"] + por_cat["cantidad"]) * 100,
+    ], np.argsort(-por_cat["ganancia"], kind="stable"))
+
+    return {
+        "totales": {
+            "productos": n,
+            "unidades": int(cantidad.sum()),
+            "valor_costo": round(float(valor_costo.sum()), 2),
+            "valor_venta": round(float(valor_venta.sum()), 2),
+            "vendidas": int(vendidas.sum()),
+            "ingresos": round(float(ingresos.sum()), 2),
+            "ganancia": round(float(ganancia.sum()), 2),
+        },
+        "productos": productos,
+        "lotes": lotes,
+        "categorias": categorias,
+    }
+
+
+# tabla -> columnas del CSV (mismo orden que las filas de calcular_reporte)
+REPORTES = {
+    "productos": ["id", "nombre", "stock", "valor_costo", "valor_venta", "vendidas",
+                  "ingresos", "ganancia", "sell_through_pct", "dias_de_stock"],
+    "lotes": ["id", "fecha", "costo_envio", "stock", "valor_costo", "valor_venta",
+              "vendidas", "ingresos", "ganancia", "sell_through_pct"],
+    "categorias": ["id", "nombre", "stock", "valor_costo", "valor_venta",
+                   "vendidas", "ingresos", "ganancia", "sell_through_pct"],
+}
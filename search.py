@@ -0,0 +1,150 @@
+import re
+from contextlib import contextmanager
+from sqlalchemy import func, select, text
+from sqlalchemy.orm import selectinload
+from models import db, Producto
+
+LIMITE = 20
+
+# Índice FTS5 sobre el nombre del producto y los nombres de sus categorías.
+# rowid = producto.id; los triggers lo mantienen al día en cada escritura.
+_CATEGORIAS_DE = (
+    "(SELECT COALESCE(group_concat(c.nombre, ' '), '') FROM categoria c "
+    "JOIN producto_categoria pc ON pc.categoria_id = c.id WHERE pc.producto_id = {id})"
+)
+
+# triggers de las altas; indexado_en_bloque() los saca durante las cargas masivas
+TRIGGERS_ALTA = {
+    "producto_fts_ai":
+        "CREATE TRIGGER IF NOT EXISTS producto_fts_ai AFTER INSERT ON producto BEGIN "
+        "INSERT INTO producto_fts (rowid, nombre, categorias) VALUES (new.id, new.nombre, ''); END",
+
+    "producto_fts_pc_ai":
+        "CREATE TRIGGER IF NOT EXISTS producto_fts_pc_ai AFTER INSERT ON producto_categoria BEGIN "
+        "UPDATE producto_fts SET categorias = " + _CATEGORIAS_DE.format(id="new.producto_id") +
+        " WHERE rowid = new.producto_id; END",
+}
+
+SQL_FTS = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS producto_fts USING fts5("
+    "nombre, categorias, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')",
+
+    *TRIGGERS_ALTA.values(),
+
+    "CREATE TRIGGER IF NOT EXISTS producto_fts_au AFTER UPDATE OF nombre ON producto BEGIN "
+    "UPDATE producto_fts SET nombre = new.nombre WHERE rowid = new.id; END",
+
+    "CREATE TRIGGER IF NOT EXISTS producto_fts_ad AFTER DELETE ON producto BEGIN "
+    "DELETE FROM producto_fts WHERE rowid = old.id; END",
+
+    "CREATE TRIGGER IF NOT EXISTS producto_fts_pc_ad AFTER DELETE ON producto_categoria BEGIN "
+    "UPDATE producto_fts SET categorias = " + _CATEGORIAS_DE.format(id="old.producto_id") +
+    " WHERE rowid = old.producto_id; END",
+
+    "CREATE TRIGGER IF NOT EXISTS producto_fts_cat_au AFTER UPDATE OF nombre ON categoria BEGIN "
+    "UPDATE producto_fts SET categorias = " + _CATEGORIAS_DE.format(id="producto_fts.rowid") +
+    " WHERE rowid IN (SELECT producto_id FROM producto_categoria WHERE categoria_id = new.id); END",
+]
+
+
+def usa_fts():
+    return db.session.get_bind().dialect.name == "sqlite"
+
+
+def crear_indice():
+    """Crea el índice y los triggers (solo SQLite) y lo llena desde cero."""
+    if not usa_fts():
+        return
+    for sentencia in SQL_FTS:
+        db.session.execute(text(sentencia))
+    reconstruir_indice()
+
+
+def reconstruir_indice():
+    db.session.execute(text("DELETE FROM producto_fts"))
+    _indexar("")
+
+
+def _indexar(condicion):
+    db.session.execute(text(
+        "INSERT INTO producto_fts (rowid, nombre, categorias) "
+        "SELECT p.id, p.nombre, " + _CATEGORIAS_DE.format(id="p.id") + " FROM producto p " + condicion
+    ))
+
+
+@contextmanager
+def indexado_en_bloque():
+    """Para altas masivas de productos con sus categorías (importador, datos de prueba).
+
+    El trigger de producto_categoria rearma el group_concat del producto por
+    cada enlace insertado y triplicaba el tiempo de una importación grande.
+    Dentro del bloque no corren los triggers de alta; al salir se vuelven a
+    crear y los productos que faltan en el índice se agregan con un solo
+    INSERT ... SELECT. Todo queda en la transacción en curso: si algo falla
+    hay que hacer rollback (que también repone los triggers).
+    """
+    if not usa_fts():
+        yield
+        return
+    for nombre in TRIGGERS_ALTA:
+        db.session.execute(text(f"DROP TRIGGER IF EXISTS {nombre}"))
+    yield
+    for sentencia in TRIGGERS_ALTA.values():
+        db.session.execute(text(sentencia))
+    _indexar("WHERE p.id NOT IN (SELECT rowid FROM producto_fts)")
+
+
+# En PostgreSQL el índice de nombre no sirve para ILIKE 'abc%' (ni para LIKE
+# si la collation no es C); este sí, para lower(nombre) LIKE 'abc%'.
+SQL_PREFIJO_PG = ("CREATE INDEX IF NOT EXISTS ix_producto_nombre_prefijo "
+                  "ON producto (lower(nombre) text_pattern_ops)")
+
+
+def crear_indice_prefijo():
+    """Índice para la búsqueda por prefijo de los motores sin FTS (solo PostgreSQL)."""
+    if db.session.get_bind().dialect.name == "postgresql":
+        db.session.execute(text(SQL_PREFIJO_PG))
+
+
+def _prefijo_like(q):
+    """'50%_x' -> '50\\%\\_x%': el texto del usuario va literal."""
+    return re.sub(r"([\\%_])", r"\\\1", q.lower()) + "%"
+
+
+def _consulta_fts(q):
+    """Convierte el texto del usuario en una consulta FTS5 de prefijos: 'red bu' -> "red"* "bu"*."""
+    palabras = re.findall(r"\w+", q, flags=re.UNICODE)
+    return " ".join(f'"{p}"*' for p in palabras)
+
+
+def buscar_ids(q, limite=LIMITE, con_stock=False):
+    """Ids de productos que coinciden con `q`, del más al menos relevante."""
+    if usa_fts():
+        consulta = _consulta_fts(q)
+        if not consulta:
+            return []
+        # el nombre pesa más que las categorías en el ranking
+        sql = ("SELECT producto_fts.rowid FROM producto_fts "
+               + ("JOIN producto p ON p.id = producto_fts.rowid AND p.cantidad > 0 " if con_stock else "")
+               + "WHERE producto_fts MATCH :q ORDER BY bm25(producto_fts, 10.0, 2.0) LIMIT :limite")
+        return list(db.session.scalars(text(sql), {"q": consulta, "limite": limite}))
+
+    # otros motores: prefijo sobre lower(nombre) (en PostgreSQL usa ix_producto_nombre_prefijo)
+    q = q.strip()
+    if not q:
+        return []
+    stmt = select(Producto.id).where(func.lower(Producto.nombre).like(_prefijo_like(q), escape="\\")) \
+        .order_by(Producto.nombre).limit(limite)
+    if con_stock:
+        stmt = stmt.where(Producto.cantidad > 0)
+    return list(db.session.scalars(stmt))
+
+
+def buscar_productos(q, limite=LIMITE, con_stock=False):
+    """Productos que coinciden con `q`, respetando el orden de relevancia."""
+    ids = buscar_ids(q, limite, con_stock)
+    if not ids:
+        return []
+    productos = {p.id: p for p in Producto.query.options(
+        selectinload(Producto.categorias)).filter(Producto.id.in_(ids))}
+    return [productos[i] for i in ids if i in productos]
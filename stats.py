@@ -0,0 +1,174 @@
+from datetime import date, datetime
+from sqlalchemy import func, select, update
+from models import db, insert_upsert, Producto, Lote, Venta, ResumenVenta
+
+MESES = ["Ene","Feb","Mar","Abr","May","Jun","Jul","Ago","Sep","Oct","Nov","Dic"]
+PERIODOS = ("dia", "mes")
+# filas por INSERT ... ON CONFLICT: 7 parámetros cada una, debajo del límite
+# de variables de SQLite (999 en versiones viejas) y del de PostgreSQL
+FILAS_POR_UPSERT = 120
+
+
+def inicio_periodo(periodo, fecha):
+    if periodo == "mes":
+        return date(fecha.year, fecha.month, 1)
+    return date(fecha.year, fecha.month, fecha.day)
+
+
+def _es_inicio_de_mes(fecha):
+    return fecha is None or (fecha.day == 1 and fecha.time() == datetime.min.time())
+
+
+def periodo_para(desde, hasta):
+    """Usa los acumulados mensuales salvo que el rango corte un mes."""
+    return "mes" if _es_inicio_de_mes(desde) and _es_inicio_de_mes(hasta) else "dia"
+
+
+def filtrar_fechas(stmt, desde=None, hasta=None):
+    """Aplica el rango [desde, hasta) sobre ResumenVenta.fecha."""
+    if desde is not None:
+        stmt = stmt.where(ResumenVenta.fecha >= desde.date())
+    if hasta is not None:
+        stmt = stmt.where(ResumenVenta.fecha < hasta.date())
+    return stmt
+
+
+def sumar_a_resumenes(acumulados):
+    """Suma {(periodo, fecha, producto_id): (unidades, ingresos, costo)} a los acumulados."""
+    if not acumulados:
+        return
+    tabla = ResumenVenta.__table__
+    filas = [{
+        "periodo": periodo,
+        "fecha": fecha,
+        "producto_id": producto_id,
+        "unidades": unidades,
+        "ingresos": ingresos,
+        "costo": costo,
+        "ganancia": ingresos - costo,
+    } for (periodo, fecha, producto_id), (unidades, ingresos, costo) in acumulados.items()]
+    for i in range(0, len(filas), FILAS_POR_UPSERT):
+        stmt = insert_upsert(tabla).values(filas[i:i + FILAS_POR_UPSERT])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["periodo", "fecha", "producto_id"],
+            set_={col: tabla.c[col] + stmt.excluded[col]
+                  for col in ("unidades", "ingresos", "costo", "ganancia")},
+        )
+        db.session.execute(stmt)
+
+
+def acumular_venta(acumulados, producto_id, fecha, cantidad, precio_venta, costo_unitario):
+    """Agrega una venta al diccionario que recibe sumar_a_resumenes()."""
+    for periodo in PERIODOS:
+        clave = (periodo, inicio_periodo(periodo, fecha), producto_id)
+        unidades, ingresos, costo = acumulados.get(clave, (0, 0.0, 0.0))
+        acumulados[clave] = (unidades + cantidad,
+                             ingresos + precio_venta * cantidad,
+                             costo + costo_unitario * cantidad)
+
+
+def completar_costos_ventas():
+    """Guarda el costo unitario en las ventas que no lo tienen.
+
+    Sale del acumulado diario de ese producto (el costo que se usó al
+    venderlo) y, si no hay, del costo actual del producto.
+    """
+    dia = ResumenVenta.__table__.alias("dia")
+    historico = (
+        select(dia.c.costo / dia.c.unidades)
+        .where(dia.c.periodo == "dia", dia.c.producto_id == Venta.producto_id,
+               dia.c.fecha == func.date(Venta.fecha), dia.c.unidades > 0)
+        .scalar_subquery()
+    )
+    actual = select(Producto.costo_unitario).where(Producto.id == Venta.producto_id).scalar_subquery()
+    return db.session.execute(
+        update(Venta).where(Venta.costo_unitario.is_(None))
+        .values(costo_unitario=func.round(func.coalesce(historico, actual, 0), 2))
+        .execution_options(synchronize_session=False)
+    ).rowcount
+
+
+def reconstruir_resumenes():
+    """Recalcula todos los acumulados a partir de la tabla Venta."""
+    db.session.execute(ResumenVenta.__table__.delete())
+
+    anio = db.extract("year", Venta.fecha)
+    mes = db.extract("month", Venta.fecha)
+    dia = db.extract("day", Venta.fecha)
+    ingresos = func.sum(Venta.precio_venta * Venta.cantidad)
+    # el costo guardado en cada venta; las ventas sin él usan el costo actual del producto
+    costo = func.sum(func.coalesce(Venta.costo_unitario, Producto.costo_unitario, 0) * Venta.cantidad)
+
+    total = 0
+    for periodo, claves in (("dia", (anio, mes, dia)), ("mes", (anio, mes))):
+        stmt = (
+            select(Venta.producto_id, *claves, func.sum(Venta.cantidad), ingresos, costo)
+            .outerjoin(Producto, Venta.producto_id == Producto.id)  # incluye las de productos borrados
+            .group_by(Venta.producto_id, *claves)
+        )
+        filas = []
+        for producto_id, *partes, unidades, ing, cos in db.session.execute(stmt):
+            a, m, d = (list(map(int, partes)) + [1])[:3]
+            filas.append({
+                "periodo": periodo,
+                "fecha": date(a, m, d),
+                "producto_id": producto_id,
+                "unidades": unidades or 0,
+                "ingresos": ing or 0,
+                "costo": cos or 0,
+                "ganancia": (ing or 0) - (cos or 0),
+            })
+        if filas:
+            db.session.execute(ResumenVenta.__table__.insert(), filas)
+        total += len(filas)
+    db.session.commit()
+    return total
+
+
+def resumen_dashboard(desde=None, hasta=None):
+    """Totales del dashboard en una sola consulta.
+
+    Las ventas y la ganancia salen de los acumulados y respetan el rango de
+    fechas; el stock y la cantidad de lotes son siempre el estado actual.
+    """
+    ventas = filtrar_fechas(
+        select(
+            func.coalesce(func.sum(ResumenVenta.unidades), 0).label("total_ventas"),
+            func.coalesce(func.sum(ResumenVenta.ganancia), 0).label("ganancias"),
+        ).where(ResumenVenta.periodo == periodo_para(desde, hasta)),
+        desde, hasta,
+    ).subquery()
+
+    stmt = select(
+        ventas.c.total_ventas,
+        ventas.c.ganancias,
+        select(func.coalesce(func.sum(Producto.cantidad), 0)).scalar_subquery().label("total_stock"),
+        select(func.count(Lote.id)).scalar_subquery().label("total_lotes"),
+    )
+    fila = db.session.execute(stmt).one()
+    return {
+        "total_ventas": fila.total_ventas,
+        "total_stock": fila.total_stock,
+        "total_lotes": fila.total_lotes,
+        "ganancia_estimada": round(fila.ganancias or 0, 2),
+    }
+
+
+def ventas_mensuales(anio, desde=None, hasta=None):
+    """Unidades vendidas por mes del año indicado (12 posiciones)."""
+    mes = db.extract("month", ResumenVenta.fecha)
+    stmt = (
+        select(mes.label("mes"), func.sum(ResumenVenta.unidades))
+        .where(
+            ResumenVenta.periodo == periodo_para(desde, hasta),
+            ResumenVenta.fecha >= date(anio, 1, 1),
+            ResumenVenta.fecha < date(anio + 1, 1, 1),
+        )
+        .group_by(mes)
+    )
+    stmt = filtrar_fechas(stmt, desde, hasta)
+
+    buckets = [0] * 12
+    for m, total in db.session.execute(stmt):
+        buckets[int(m) - 1] = total or 0
+    return buckets
@@ -0,0 +1,98 @@
+"""Fixtures de los tests.
+
+Cada test corre contra todas las bases de BASES: SQLite siempre y
+PostgreSQL si TEST_POSTGRES_URL apunta a una base descartable (se borra
+todo su esquema public al empezar), p. ej.
+
+    docker run --rm -p 5432:5432 -e POSTGRES_PASSWORD=x postgres:16
+    TEST_POSTGRES_URL=postgresql://postgres:x@localhost/postgres python -m pytest
+
+app.py configura la base al importarse, así que por cada motor se carga
+una copia nueva del módulo con DATABASE_URL apuntando a esa base.
+"""
+import importlib.util
+import os
+import pytest
+from sqlalchemy import event
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASES = ["sqlite", "postgresql"]
+
+
+def _url_postgres():
+    url = os.environ.get("TEST_POSTGRES_URL")
+    if not url:
+        pytest.skip("TEST_POSTGRES_URL no definida")
+    pytest.importorskip("psycopg2" if "+psycopg" not in url else "psycopg")
+    from sqlalchemy import create_engine, text
+    motor = create_engine(url)
+    with motor.begin() as conn:
+        conn.execute(text("DROP SCHEMA public CASCADE"))
+        conn.execute(text("CREATE SCHEMA public"))
+    motor.dispose()
+    return url
+
+
+def _cargar_app(nombre):
+    spec = importlib.util.spec_from_file_location(f"app_{nombre}", os.path.join(RAIZ, "app.py"))
+    modulo = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(modulo)
+    return modulo
+
+
+@pytest.fixture(scope="session", params=BASES)
+def app(request, tmp_path_factory):
+    carpeta = tmp_path_factory.mktemp(request.param)
+    if request.param == "sqlite":
+        url = "sqlite:///" + str(carpeta / "test.db")
+    else:
+        url = _url_postgres()
+    os.environ.update(DATABASE_URL=url, UPLOAD_FOLDER=str(carpeta / "uploads"), TRABAJOS_HILOS="0")
+    modulo = _cargar_app(request.param)
+    modulo.app.config["TESTING"] = True
+    yield modulo.app
+    with modulo.app.app_context():
+        from models import db
+        db.session.remove()
+        db.engine.dispose()
+
+
+@pytest.fixture
+def ctx(app):
+    """Contexto de la app con la sesión limpia al terminar."""
+    from models import db
+    from cache import cache_catalogo
+    cache_catalogo.invalidar()
+    with app.app_context():
+        yield app
+        db.session.remove()
+
+
+@pytest.fixture
+def cliente(ctx):
+    return ctx.test_client()
+
+
+@pytest.fixture
+def contar_sql(ctx):
+    """Cuenta las sentencias ejecutadas: `with contar_sql() as n: ...; n[0]`."""
+    from contextlib import contextmanager
+    from models import db
+
+    @contextmanager
+    def contar():
+        n = [0]
+
+        def sumar(*args):
+            n[0] += 1
+        event.listen(db.engine, "before_cursor_execute", sumar)
+        try:
+            yield n
+        finally:
+            event.remove(db.engine, "before_cursor_execute", sumar)
+    return contar
+
+
+@pytest.fixture
+def uploads(ctx):
+    return os.path.join(RAIZ, ctx.config["UPLOAD_FOLDER"])
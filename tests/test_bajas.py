@@ -0,0 +1,73 @@
+"""Bajas en bloque con las claves foráneas verificadas (también en SQLite)."""
+import os
+from sqlalchemy import func, select, text
+from models import db, producto_categoria, Blob, CambioStock, Categoria, FotoProducto, Lote, Producto, Venta
+from datos_prueba import generar_catalogo, generar_ventas
+from jobs import procesar_pendientes
+from stats import reconstruir_resumenes, resumen_dashboard
+
+
+def _sin_violaciones():
+    if db.engine.dialect.name == "sqlite":
+        assert db.session.execute(text("PRAGMA foreign_key_check")).all() == []
+
+
+def test_borrar_lote_con_ventas(cliente, contar_sql, uploads):
+    generar_catalogo(1, 200, 4, 2, uploads)
+    lote = db.session.scalar(select(func.max(Lote.id)))
+    ids = db.session.scalars(select(Producto.id).where(Producto.lote_id == lote)).all()
+    nombre = db.session.get(Producto, ids[0]).nombre
+    generar_ventas(100, ids[:10])
+    reconstruir_resumenes()
+    antes = resumen_dashboard()
+
+    with contar_sql() as n:
+        assert cliente.post(f"/lote/{lote}/eliminar").status_code == 302
+    assert n[0] < 20  # no depende de la cantidad de productos ni de fotos
+
+    assert db.session.get(Lote, lote) is None
+    assert db.session.scalar(select(func.count()).select_from(Producto).where(Producto.id.in_(ids))) == 0
+    assert db.session.scalar(select(func.count()).select_from(FotoProducto)
+                             .where(FotoProducto.producto_id.in_(ids))) == 0
+    assert db.session.scalar(select(func.count()).select_from(producto_categoria)
+                             .where(producto_categoria.c.producto_id.in_(ids))) == 0
+    assert db.session.scalar(select(func.count()).select_from(CambioStock)
+                             .where(CambioStock.tipo == "baja", CambioStock.producto_id.in_(ids))) == len(ids)
+    _sin_violaciones()
+
+    # las ventas quedan, con el nombre del producto, y los totales no cambian
+    huerfanas = db.session.scalars(select(Venta).where(Venta.producto_id.is_(None))).all()
+    assert sum(v.cantidad for v in huerfanas) >= 100
+    assert nombre in {v.producto_nombre for v in huerfanas}
+    assert resumen_dashboard()["total_ventas"] == antes["total_ventas"]
+    reconstruir_resumenes()
+    assert resumen_dashboard()["total_ventas"] == antes["total_ventas"]
+    assert resumen_dashboard()["ganancia_estimada"] == antes["ganancia_estimada"]
+
+
+def test_los_archivos_se_borran_despues_del_commit(cliente, uploads):
+    generar_catalogo(1, 5, 0, 1, uploads)
+    lote = db.session.scalar(select(func.max(Lote.id)))
+    rutas = set(db.session.scalars(select(FotoProducto.ruta).join(Producto).where(Producto.lote_id == lote)))
+    cliente.post(f"/lote/{lote}/eliminar")
+    procesar_pendientes()
+    for ruta in rutas:
+        blob = db.session.get(Blob, ruta)
+        en_uso = blob is not None and blob.referencias > 0
+        assert os.path.exists(os.path.join(uploads, ruta)) == en_uso
+
+
+def test_borrar_producto_y_categoria(cliente):
+    generar_catalogo(1, 3, 2)
+    producto = db.session.scalar(select(func.max(Producto.id)))
+    generar_ventas(5, [producto])
+    assert cliente.post(f"/producto/{producto}/eliminar").status_code == 302
+    assert db.session.get(Producto, producto) is None
+    assert cliente.get("/venta").status_code == 200
+
+    categoria = db.session.scalar(select(func.max(Categoria.id)))
+    assert cliente.post(f"/categoria/{categoria}/eliminar").status_code == 302
+    assert db.session.get(Categoria, categoria) is None
+    assert db.session.scalar(select(func.count()).select_from(producto_categoria)
+                             .where(producto_categoria.c.categoria_id == categoria)) == 0
+    _sin_violaciones()
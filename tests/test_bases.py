@@ -0,0 +1,49 @@
+"""Lo que tiene que valer igual en SQLite y en PostgreSQL."""
+import pytest
+from sqlalchemy import create_engine, func, select, text
+from models import db, Lote, Producto, Venta
+from database import copiar_datos
+from datos_prueba import generar
+
+
+@pytest.mark.parametrize("ruta", ["/dashboard", "/lotes", "/productos", "/stock", "/catalogo",
+                                  "/categorias", "/venta", "/pedido", "/reportes", "/buscar?q=taza",
+                                  "/api/v1/productos", "/api/v1/cambios"])
+def test_paginas_responden(cliente, ruta):
+    generar(lotes=2, productos=20, categorias=3, ventas=50, semilla=1)
+    assert cliente.get(ruta).status_code == 200
+
+
+def test_importes_exactos(ctx):
+    # NUMERIC: 0.1 + 0.2 guardado y sumado en la base no arrastra error de float
+    lote = Lote(costo_envio=0.1)
+    db.session.add(lote)
+    db.session.flush()
+    producto = Producto(nombre="Exacto", cantidad=3, precio_compra=0.1, costo_envio_unitario=0.2, lote_id=lote.id)
+    db.session.add(producto)
+    db.session.commit()
+    total = db.session.scalar(select(func.sum(Producto.precio_compra + Producto.costo_envio_unitario))
+                              .where(Producto.id == producto.id))
+    assert round(float(total), 2) == 0.3
+    assert db.session.get(Producto, producto.id).costo_unitario == 0.3
+
+
+def test_valores_por_defecto_del_servidor(ctx):
+    # filas escritas sin el ORM (importer, datos_prueba) reciben los defaults de la base
+    db.session.execute(text("INSERT INTO producto (nombre) VALUES ('Sin datos')"))
+    fila = db.session.execute(text(
+        "SELECT cantidad, precio_compra, margen FROM producto WHERE nombre = 'Sin datos'")).one()
+    db.session.rollback()
+    assert (fila.cantidad, float(fila.precio_compra), float(fila.margen)) == (0, 0.0, 0.5)
+
+
+def test_copiar_datos(ctx, tmp_path):
+    generar(lotes=2, productos=30, categorias=3, ventas=40, semilla=2)
+    destino = "sqlite:///" + str(tmp_path / "copia.db")
+    copiar_datos(ctx.config["SQLALCHEMY_DATABASE_URI"], destino, tanda=7, progreso=lambda m: None)
+    copia = create_engine(destino)
+    with copia.connect() as conn:
+        for modelo in (Producto, Venta):
+            origen = db.session.scalar(select(func.count()).select_from(modelo))
+            assert conn.scalar(select(func.count()).select_from(modelo.__table__)) == origen
+    copia.dispose()
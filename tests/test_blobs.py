@@ -0,0 +1,110 @@
+"""Almacén de fotos por contenido: caché de las variantes y carreras al reutilizar un blob."""
+import io
+import os
+import threading
+import time
+from sqlalchemy import select
+from models import db, Blob
+from blobs import borrar_si_huerfano, es_blob, guardar_blob, soltar_blob
+from images import generar_variantes, ruta_variante
+from jobs import procesar_pendientes
+from datos_prueba import _foto
+
+
+def _contenido():
+    return io.BytesIO(os.urandom(256))
+
+
+def test_nombres_por_contenido():
+    nombre = "0123456789abcdef0123456789abcdef"
+    assert es_blob(f"{nombre}.jpg")
+    assert es_blob(f"variantes/{nombre}_thumb.webp")
+    assert es_blob(f"variantes/{nombre}_medium.webp")
+    assert not es_blob("variantes/GettyImages-123_thumb.webp")
+    assert not es_blob(f"otra/{nombre}.jpg")
+    assert not es_blob("GettyImages-123_1.jpg")
+
+
+def test_variantes_con_cache_inmutable(cliente, uploads):
+    ruta = guardar_blob(uploads, _foto(99), "foto.jpg")
+    db.session.commit()
+    generar_variantes(uploads, ruta)
+    for archivo in (ruta, ruta_variante(ruta, "thumb")):
+        respuesta = cliente.get(f"/uploads/{archivo}")
+        assert respuesta.status_code == 200
+        assert "immutable" in respuesta.headers["Cache-Control"]
+        assert "max-age=31536000" in respuesta.headers["Cache-Control"]
+
+
+def test_subida_mientras_se_borra_el_mismo_blob(ctx, uploads):
+    contenido = os.urandom(256)
+    ruta = guardar_blob(uploads, io.BytesIO(contenido), "foto.jpg")
+    db.session.commit()
+    soltar_blob(ruta)  # la última foto se borró: queda agendado el borrado
+    db.session.commit()
+
+    # la misma imagen se vuelve a subir y el request todavía no hizo commit...
+    assert guardar_blob(uploads, io.BytesIO(contenido), "otra.jpg") == ruta
+
+    # ...mientras el trabajo de borrado corre en otro proceso/hilo
+    resultado = []
+
+    def borrar():
+        with ctx.app_context():
+            resultado.append(borrar_si_huerfano(uploads, ruta))
+            db.session.commit()
+    hilo = threading.Thread(target=borrar)
+    hilo.start()
+    time.sleep(0.3)
+    db.session.commit()
+    hilo.join()
+
+    assert resultado == [False]
+    assert os.path.exists(os.path.join(uploads, ruta))
+    assert db.session.get(Blob, ruta).referencias == 1
+
+
+def test_subida_despues_de_borrar_reescribe_el_archivo(ctx, uploads):
+    contenido = os.urandom(256)
+    ruta = guardar_blob(uploads, io.BytesIO(contenido), "foto.jpg")
+    db.session.commit()
+    soltar_blob(ruta)
+    assert borrar_si_huerfano(uploads, ruta)
+    db.session.commit()
+    assert not os.path.exists(os.path.join(uploads, ruta))
+
+    guardar_blob(uploads, io.BytesIO(contenido), "foto.jpg")
+    db.session.commit()
+    assert os.path.exists(os.path.join(uploads, ruta))
+
+
+def test_rollback_no_deja_archivos_sin_uso(ctx, uploads):
+    ruta = guardar_blob(uploads, _contenido(), "foto.jpg")
+    db.session.rollback()
+    assert db.session.scalar(select(Blob).where(Blob.ruta == ruta)) is None
+    procesar_pendientes()
+    assert not os.path.exists(os.path.join(uploads, ruta))
+
+
+def test_extension_por_contenido(ctx, uploads):
+    contenido = _foto(77).getvalue()
+    ruta = guardar_blob(uploads, io.BytesIO(contenido), "foto.jpeg")
+    assert ruta.endswith(".jpg")
+    assert guardar_blob(uploads, io.BytesIO(contenido), "FOTO.JPG") == ruta
+    assert guardar_blob(uploads, io.BytesIO(contenido), "mal_nombrada.png") == ruta
+    db.session.commit()
+    assert db.session.get(Blob, ruta).referencias == 3
+    assert guardar_blob(uploads, _contenido(), "foto.jpeg").endswith(".jpg")  # no es imagen: por el nombre
+    db.session.rollback()
+
+
+def test_variantes_compartidas_sobreviven_a_otra_extension(ctx, uploads):
+    contenido = _foto(78).getvalue()
+    ruta = guardar_blob(uploads, io.BytesIO(contenido), "a.jpg")
+    otra = guardar_blob(uploads, io.BytesIO(contenido), "b.jpeg")
+    db.session.commit()
+    generar_variantes(uploads, ruta)
+    soltar_blob(otra)
+    db.session.commit()
+    assert not borrar_si_huerfano(uploads, otra)  # sigue referenciado por la otra foto
+    assert os.path.exists(os.path.join(uploads, ruta_variante(ruta, "thumb")))
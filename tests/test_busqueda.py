@@ -0,0 +1,53 @@
+"""Búsqueda: prefijo sin FTS, límites del autocompletado e indexado de altas en bloque."""
+import io
+import pytest
+from sqlalchemy import text
+import search
+from models import db, Producto
+from importer import importar
+
+
+@pytest.fixture
+def sin_fts(ctx, monkeypatch):
+    monkeypatch.setattr(search, "usa_fts", lambda: False)
+
+
+def test_prefijo_sin_distinguir_mayusculas(sin_fts):
+    for nombre in ("Zeta Cable USB", "zeta cargador", "Zeta 50% off", "Zeta 50x"):
+        db.session.add(Producto(nombre=nombre, cantidad=1, precio_compra=1))
+    db.session.commit()
+
+    def nombres(q):
+        return {db.session.get(Producto, i).nombre for i in search.buscar_ids(q)}
+    assert nombres("ZETA C") == {"Zeta Cable USB", "zeta cargador"}
+    assert nombres("zeta 50%") == {"Zeta 50% off"}  # % y _ del usuario son literales
+    assert nombres("zeta_") == set()
+
+
+def test_indice_de_prefijo_en_postgresql(ctx):
+    if db.engine.dialect.name != "postgresql":
+        pytest.skip("el índice es solo de PostgreSQL")
+    indices = db.session.scalars(text("SELECT indexname FROM pg_indexes WHERE tablename = 'producto'")).all()
+    assert "ix_producto_nombre_prefijo" in indices
+
+
+def test_limite_del_autocompletado(cliente):
+    for i in range(3):
+        db.session.add(Producto(nombre=f"Acotado {i}", cantidad=1, precio_compra=1))
+    db.session.commit()
+    for limite, esperados in (("-1", 1), ("0", 1), ("2", 2), ("500", 3)):
+        respuesta = cliente.get(f"/api/productos/buscar?q=acotado&limite={limite}")
+        assert respuesta.status_code == 200
+        assert len(respuesta.get_json()) == esperados
+
+
+def test_importacion_queda_indexada(ctx):
+    if not search.usa_fts():
+        pytest.skip("el índice FTS es solo de SQLite")
+    archivo = "nombre,categorias\nImportado Yerbera,Mate|Regalos\nImportado Bombilla,Mate\n"
+    importar("productos", io.BytesIO(archivo.encode()), "csv")
+    assert {p.nombre for p in search.buscar_productos("mate")} == {"Importado Yerbera", "Importado Bombilla"}
+    # los triggers volvieron: un alta común también se indexa
+    db.session.add(Producto(nombre="Termo suelto", precio_compra=1))
+    db.session.commit()
+    assert [p.nombre for p in search.buscar_productos("termo")] == ["Termo suelto"]
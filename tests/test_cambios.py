@@ -0,0 +1,60 @@
+"""Registro de cambios: escritura al confirmar, consulta por cursor y límite de streams."""
+from models import db, CambioStock, Producto
+
+
+def test_cursor_devuelve_cada_cambio_una_vez(cliente):
+    cursor = cliente.get("/api/v1/cambios").get_json()["cursor"]
+    producto = Producto(nombre="Seguido", cantidad=5, precio_compra=10)
+    db.session.add(producto)
+    db.session.commit()
+    for _ in range(2):
+        cliente.post("/pedido", json={"lineas": [
+            {"producto_id": producto.id, "cantidad": 1, "precio_venta": 20}]})
+
+    vistos = []
+    while True:
+        cuerpo = cliente.get(f"/api/v1/cambios?desde={cursor}&limite=1").get_json()
+        vistos += [c["id"] for c in cuerpo["datos"]]
+        cursor = cuerpo["cursor"]
+        if not cuerpo["hay_mas"]:
+            break
+    assert len(vistos) == len(set(vistos)) == 2
+    assert vistos == sorted(vistos)
+
+
+def test_streams_limitados_por_worker(cliente, ctx):
+    ctx.config["CAMBIOS_SSE_MAX"] = 1
+    try:
+        abierto = cliente.get("/api/v1/cambios/stream")
+        assert abierto.status_code == 200
+        assert next(abierto.response).startswith(b"retry:")
+
+        lleno = cliente.get("/api/v1/cambios/stream")
+        assert lleno.status_code == 503
+        assert lleno.headers["Retry-After"]
+
+        abierto.close()
+        otro = cliente.get("/api/v1/cambios/stream")
+        assert otro.status_code == 200
+        otro.close()
+    finally:
+        ctx.config["CAMBIOS_SSE_MAX"] = 2
+
+
+def test_cambios_se_escriben_al_confirmar(ctx):
+    from cambios import registrar_cambios, ultimo_id
+    producto = Producto(nombre="Pendiente", cantidad=1, precio_compra=1)
+    db.session.add(producto)
+    db.session.commit()
+    antes = ultimo_id()
+
+    registrar_cambios([producto.id], "modificacion")
+    producto.cantidad = 7
+    db.session.rollback()
+    assert ultimo_id() == antes  # el rollback descarta lo anotado
+
+    registrar_cambios([producto.id], "modificacion")
+    producto.cantidad = 7
+    db.session.commit()
+    cambio = db.session.get(CambioStock, ultimo_id())
+    assert (cambio.producto_id, cambio.cantidad) == (producto.id, 7)  # el estado del commit
@@ -0,0 +1,50 @@
+"""La cantidad de consultas de cada página no depende de cuántos datos haya."""
+import base64
+import json
+from datetime import datetime
+import pytest
+from sqlalchemy import select, update
+from models import db, Lote
+from cache import cache_catalogo
+from datos_prueba import generar
+
+PAGINAS = ["/productos", "/catalogo", "/lotes", "/venta", "/stock"]
+
+
+def _consultas(cliente, contar_sql):
+    cuentas = {}
+    for ruta in PAGINAS:
+        cache_catalogo.invalidar()  # medir el render, no la cache
+        with contar_sql() as n:
+            assert cliente.get(ruta).status_code == 200
+        cuentas[ruta] = n[0]
+    return cuentas
+
+
+@pytest.mark.parametrize("ruta", PAGINAS)
+def test_consultas_fijas_por_pagina(cliente, contar_sql, uploads, ruta):
+    generar(lotes=3, productos=10, categorias=3, ventas=20, fotos=1, carpeta_fotos=uploads, semilla=3)
+    chica = _consultas(cliente, contar_sql)[ruta]
+    # más de una página de cada listado, y lotes con cientos de productos (más de 500 por página)
+    generar(lotes=60, productos=300, categorias=10, ventas=300, fotos=2, carpeta_fotos=uploads, semilla=4)
+    generar(lotes=2, productos=800, categorias=0, ventas=0, fotos=1, carpeta_fotos=uploads, semilla=5)
+    ultimos = select(Lote.id).order_by(Lote.id.desc()).limit(2).scalar_subquery()
+    db.session.execute(update(Lote).where(Lote.id.in_(ultimos)).values(fecha=datetime.utcnow()))
+    db.session.commit()  # que queden en la primera página de /lotes
+    grande = _consultas(cliente, contar_sql)[ruta]
+    assert grande == chica
+
+
+
+CURSORES_INVALIDOS = [
+    ("/productos", [{"a": 1}, 1]), ("/catalogo", [[], 1]), ("/stock", ["x", "y"]),
+    ("/productos", [True, 1]), ("/venta", [1, 1]), ("/venta", ["2024-13-45", 1]),
+    ("/lotes", [{"a": 1}, 1]), ("/lotes", ["2024-01-01", "1"]),
+    ("/api/v1/productos", [{"a": 1}]), ("/api/v1/productos", ["1"]), ("/api/v1/ventas", [1.5]),
+]
+
+
+@pytest.mark.parametrize("ruta, valores", CURSORES_INVALIDOS)
+def test_cursor_con_tipos_invalidos(cliente, ruta, valores):
+    cursor = base64.urlsafe_b64encode(json.dumps(valores).encode()).decode()
+    assert cliente.get(f"{ruta}?cursor={cursor}").status_code == 400
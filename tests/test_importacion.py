@@ -0,0 +1,71 @@
+"""Importación: ids explícitos sin duplicados y ventas con muchos acumulados."""
+import io
+import sqlite3
+from datetime import date, timedelta
+from sqlalchemy import func, select
+from models import db, Lote, Producto, ResumenVenta
+from importer import importar
+
+
+def _csv(texto):
+    return io.BytesIO(texto.encode())
+
+
+def test_productos_con_id_no_se_duplican(ctx):
+    base = (db.session.scalar(select(func.max(Producto.id))) or 0) + 1000
+    archivo = (
+        "id,nombre,cantidad,precio_compra,categorias\n"
+        f"{base},Importado A,3,10,Importadas\n"
+        f"{base + 1},Importado B,1,20,Importadas|Otras\n"
+        ",Importado C,2,5,\n"
+    )
+    resumen = importar("productos", _csv(archivo), "csv")
+    assert (resumen["importadas"], resumen["errores"]) == (3, 0)
+    assert db.session.get(Producto, base + 1).nombre == "Importado B"
+    assert len(db.session.get(Producto, base + 1).categorias) == 2
+
+    total = db.session.scalar(select(func.count(Producto.id)))
+    resumen = importar("productos", _csv(archivo), "csv")
+    assert resumen["errores"] == 2
+    assert "ya existe" in resumen["detalle_errores"][0][1]
+    assert db.session.scalar(select(func.count(Producto.id))) == total + 1  # solo la fila sin id
+
+    nuevo = Producto(nombre="Después de importar", cantidad=1, precio_compra=1)
+    db.session.add(nuevo)
+    db.session.commit()
+    assert nuevo.id > base + 1
+
+
+def test_lotes_con_id_avanzan_la_secuencia(ctx):
+    base = (db.session.scalar(select(func.max(Lote.id))) or 0) + 1000
+    resumen = importar("lotes", _csv(f"id,fecha,costo_envio\n{base},2024-01-02,10\n"), "csv")
+    assert resumen["importadas"] == 1
+    lote = Lote(costo_envio=0)
+    db.session.add(lote)
+    db.session.commit()
+    assert lote.id > base
+
+
+def test_ventas_con_muchos_acumulados(ctx):
+    # 10000 días de un mismo producto: más de 10000 claves de acumulado, a 7
+    # parámetros cada una no entran en un INSERT ni en PostgreSQL (65535) ni
+    # en SQLite con su límite por defecto (32766; algunas distribuciones lo suben)
+    producto = Producto(nombre="Histórico", cantidad=0, precio_compra=10)
+    db.session.add(producto)
+    db.session.commit()
+    inicio = date(1990, 1, 1)
+    filas = "".join(f"{producto.id},{inicio + timedelta(days=d)},2,15,10\n" for d in range(10000))
+    # la sesión sigue con esta conexión hasta el commit de la importación
+    conexion = db.session.connection().connection.driver_connection
+    sqlite = db.engine.dialect.name == "sqlite"
+    if sqlite:
+        anterior = conexion.setlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER, 32766)
+    try:
+        resumen = importar("ventas", _csv("producto_id,fecha,cantidad,precio_venta,costo_unitario\n" + filas), "csv")
+    finally:
+        if sqlite:
+            conexion.setlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER, anterior)
+    assert (resumen["importadas"], resumen["errores"]) == (10000, 0)
+    unidades = db.session.scalar(select(func.sum(ResumenVenta.unidades)).where(
+        ResumenVenta.producto_id == producto.id, ResumenVenta.periodo == "dia"))
+    assert unidades == 20000
@@ -0,0 +1,64 @@
+"""Varios workers que arrancan a la vez sobre una base sin migrar."""
+import os
+import sqlite3
+import subprocess
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _arrancar(entorno):
+    return subprocess.run([sys.executable, "-W", "ignore", "-c", "import app"], cwd=RAIZ, env=entorno,
+                          capture_output=True, text=True, timeout=120)
+
+
+# Esquema de la primera versión de la app, antes de toda migración. Se arma
+# acá y no copiando el stock.db del repo: `python app.py` lo migra en el lugar.
+ESQUEMA_ORIGINAL = """
+CREATE TABLE lote (id INTEGER NOT NULL, fecha DATETIME, costo_envio FLOAT NOT NULL, PRIMARY KEY (id));
+CREATE TABLE categoria (id INTEGER NOT NULL, nombre VARCHAR(100) NOT NULL, PRIMARY KEY (id), UNIQUE (nombre));
+CREATE TABLE producto (
+    id INTEGER NOT NULL, nombre VARCHAR(150) NOT NULL, cantidad INTEGER, precio_compra FLOAT NOT NULL,
+    costo_envio_unitario FLOAT, costo_extra FLOAT, margen FLOAT, precio_sugerido FLOAT, lote_id INTEGER,
+    PRIMARY KEY (id), FOREIGN KEY(lote_id) REFERENCES lote (id));
+CREATE TABLE producto_categoria (
+    producto_id INTEGER NOT NULL, categoria_id INTEGER NOT NULL, PRIMARY KEY (producto_id, categoria_id),
+    FOREIGN KEY(producto_id) REFERENCES producto (id), FOREIGN KEY(categoria_id) REFERENCES categoria (id));
+CREATE TABLE foto_producto (
+    id INTEGER NOT NULL, ruta VARCHAR(300) NOT NULL, producto_id INTEGER NOT NULL,
+    PRIMARY KEY (id), FOREIGN KEY(producto_id) REFERENCES producto (id));
+CREATE TABLE venta (
+    id INTEGER NOT NULL, fecha DATETIME, producto_id INTEGER, cantidad INTEGER NOT NULL,
+    precio_venta FLOAT NOT NULL, PRIMARY KEY (id), FOREIGN KEY(producto_id) REFERENCES producto (id));
+
+INSERT INTO lote VALUES (1, '2024-03-01 10:00:00', 1500);
+INSERT INTO categoria VALUES (1, 'Remeras');
+INSERT INTO producto VALUES (1, 'Remera negra', 8, 1000, 50, 0, 0.5, 1575, 1);
+INSERT INTO producto VALUES (2, 'Taza', 3, 400, 0, 20, 0.4, 588, NULL);
+INSERT INTO producto_categoria VALUES (1, 1);
+INSERT INTO venta VALUES (1, '2024-03-05 12:00:00', 1, 2, 1600);
+INSERT INTO venta VALUES (2, '2024-03-06 12:00:00', 2, 1, 600);
+"""
+
+
+def test_arranque_concurrente_migra_una_vez(tmp_path):
+    base = tmp_path / "stock.db"
+    conn = sqlite3.connect(base)
+    conn.executescript(ESQUEMA_ORIGINAL)
+    conn.close()
+    entorno = {**os.environ, "DATABASE_URL": f"sqlite:///{base}",
+               "UPLOAD_FOLDER": str(tmp_path / "uploads"), "TRABAJOS_HILOS": "0"}
+    with ThreadPoolExecutor(4) as pool:
+        resultados = list(pool.map(_arrancar, [entorno] * 4))
+    assert [r.stderr for r in resultados if r.returncode] == []
+
+    conn = sqlite3.connect(base)
+    aplicadas = [fila[0] for fila in conn.execute("SELECT id FROM schema_migracion")]
+    ventas = conn.execute("SELECT producto_id, costo_unitario FROM venta ORDER BY id").fetchall()
+    resumen = conn.execute("SELECT sum(unidades) FROM resumen_venta WHERE periodo = 'dia'").fetchone()
+    conn.close()
+    from database import MIGRACIONES
+    assert aplicadas == [nombre for nombre, _ in MIGRACIONES]
+    assert ventas == [(1, 1050), (2, 420)]  # los datos viejos pasan todas las migraciones
+    assert resumen == (3,)
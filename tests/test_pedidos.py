@@ -0,0 +1,69 @@
+"""Pedidos: respuestas del endpoint JSON y ventas concurrentes sin sobreventa."""
+import threading
+import pytest
+from sqlalchemy import func, select
+from models import db, Producto, Venta
+
+
+def _producto(cantidad):
+    producto = Producto(nombre="Concurrente", cantidad=cantidad, precio_compra=100)
+    db.session.add(producto)
+    db.session.commit()
+    return producto.id
+
+
+def _linea(producto_id, cantidad=1):
+    return {"producto_id": producto_id, "cantidad": cantidad, "precio_venta": 150}
+
+
+def test_codigos_de_respuesta(cliente):
+    pid = _producto(3)
+    assert cliente.post("/pedido", data="{no es json", content_type="application/json").status_code == 400
+    assert cliente.post("/pedido", json={"lineas": [{"producto_id": "x"}]}).status_code == 400
+    assert cliente.post("/pedido", json={"lineas": [_linea(pid, 0)]}).status_code == 400
+    assert cliente.post("/pedido", json={"lineas": [_linea(999999)]}).status_code == 404
+    assert cliente.post("/pedido", json={"lineas": [_linea(pid, 4)]}).status_code == 409
+    assert cliente.post("/pedido", json={"lineas": [_linea(pid, 3)]}).status_code == 201
+
+
+def test_lineas_repetidas_informan_el_stock_real(cliente):
+    pid = _producto(3)
+    respuesta = cliente.post("/pedido", json={"lineas": [_linea(pid, 2), _linea(pid, 2)]})
+    assert respuesta.status_code == 409
+    assert "Disponible: 3" in respuesta.get_json()["error"]
+    assert db.session.get(Producto, pid).cantidad == 3
+    assert cliente.post("/pedido", json={"lineas": [_linea(pid, 1), _linea(pid, 2)]}).status_code == 201
+    assert db.session.scalar(select(func.sum(Venta.cantidad)).where(Venta.producto_id == pid)) == 3
+
+
+@pytest.mark.parametrize("hilos, pedidos", [(8, 15)])
+def test_sin_sobreventa_con_pedidos_en_paralelo(ctx, hilos, pedidos):
+    stock = 40
+    pid = _producto(stock)
+    otro = _producto(1000)
+    estados = []
+    largada = threading.Barrier(hilos)
+
+    def vender():
+        cliente = ctx.test_client()
+        largada.wait()
+        for i in range(pedidos):
+            lineas = [_linea(pid, 1 + i % 2)] + ([_linea(otro)] if i % 3 == 0 else [])
+            estados.append(cliente.post("/pedido", json={"lineas": lineas}).status_code)
+
+    trabajadores = [threading.Thread(target=vender) for _ in range(hilos)]
+    for t in trabajadores:
+        t.start()
+    for t in trabajadores:
+        t.join()
+
+    db.session.expire_all()
+    vendidas = db.session.scalar(select(func.sum(Venta.cantidad)).where(Venta.producto_id == pid))
+    assert set(estados) <= {201, 409}
+    assert estados.count(409) > 0  # hubo competencia por el stock
+    assert db.session.get(Producto, pid).cantidad == 0
+    assert vendidas == stock
+    # las líneas del otro producto solo quedaron en los pedidos confirmados
+    otro_vendidas = db.session.scalar(select(func.coalesce(func.sum(Venta.cantidad), 0))
+                                      .where(Venta.producto_id == otro))
+    assert db.session.get(Producto, otro).cantidad == 1000 - otro_vendidas
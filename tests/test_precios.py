@@ -0,0 +1,51 @@
+"""Precios guardados: el ORM, el importador y los UPDATE en bloque redondean igual."""
+import io
+import random
+from sqlalchemy import select
+from models import db, Lote, Producto
+from importer import importar
+from precios import recalcular_precios, repreciar_lote, verificar_precios
+
+
+def _productos_al_azar(n, lote_id=None, semilla=16):
+    azar = random.Random(semilla)
+    return [Producto(
+        nombre=f"Precio {i}", cantidad=azar.randint(0, 20), lote_id=lote_id,
+        precio_compra=round(azar.uniform(1, 5000), 2),
+        costo_envio_unitario=round(azar.uniform(0, 50), 2),
+        costo_extra=azar.choice([0, round(azar.uniform(0, 30), 2)]),
+        margen=azar.choice([0.125, 0.375, 0.5, 0.05, round(azar.uniform(0, 1), 4)]),
+    ) for i in range(n)]
+
+
+def test_lo_que_guarda_la_app_es_consistente(ctx):
+    db.session.add_all(_productos_al_azar(2000))
+    db.session.add(Producto(nombre="Mitad exacta", precio_compra=81.24, margen=0.125))
+    db.session.add(Producto(nombre="Margen por defecto", precio_compra=10))
+    archivo = "nombre,precio_compra,costo_extra,margen\n" + "".join(
+        f"Importado {i},{p.precio_compra},{p.costo_extra},{p.margen}\n"
+        for i, p in enumerate(_productos_al_azar(500, semilla=9)))
+    importar("productos", io.BytesIO(archivo.encode()), "csv")
+    db.session.commit()
+    assert db.session.scalar(select(Producto.precio_sugerido).where(Producto.nombre == "Mitad exacta")) == 91.40
+    assert db.session.scalar(select(Producto.precio_sugerido).where(Producto.nombre == "Margen por defecto")) == 15
+    assert verificar_precios() == []
+
+
+def test_update_en_bloque_coincide_con_el_orm(ctx):
+    lote = Lote(costo_envio=0)
+    db.session.add(lote)
+    db.session.flush()
+    productos = _productos_al_azar(300, lote.id, semilla=3)
+    db.session.add_all(productos)
+    db.session.commit()
+    ids = [p.id for p in productos]
+    guardados = dict(db.session.execute(select(Producto.id, Producto.precio_sugerido).where(Producto.id.in_(ids))).all())
+
+    recalcular_precios(ids)
+    db.session.commit()
+    assert dict(db.session.execute(select(Producto.id, Producto.precio_sugerido).where(Producto.id.in_(ids))).all()) == guardados
+
+    repreciar_lote(lote.id, 1234.5, margen=0.375)
+    db.session.commit()
+    assert verificar_precios() == []
@@ -0,0 +1,39 @@
+"""Acumulados de ventas: lo incremental y la reconstrucción dan lo mismo."""
+from sqlalchemy import select
+from models import db, Lote, Producto, Venta
+from precios import repreciar_lote
+from stats import reconstruir_resumenes, resumen_dashboard
+
+
+def _producto(cantidad=10, precio_compra=100):
+    lote = Lote(costo_envio=0)
+    db.session.add(lote)
+    db.session.flush()
+    producto = Producto(nombre="Resumen", cantidad=cantidad, precio_compra=precio_compra, margen=0.5,
+                        lote_id=lote.id)
+    db.session.add(producto)
+    db.session.commit()
+    return producto
+
+
+def test_la_venta_guarda_el_costo(cliente):
+    producto = _producto()
+    cliente.post("/pedido", json={"lineas": [{"producto_id": producto.id, "cantidad": 2, "precio_venta": 180}]})
+    venta = db.session.scalars(select(Venta).where(Venta.producto_id == producto.id)).one()
+    assert venta.costo_unitario == 100
+
+
+def test_reconstruir_no_reprecia_la_historia(cliente):
+    producto = _producto()
+    antes = resumen_dashboard()
+    cliente.post("/pedido", json={"lineas": [{"producto_id": producto.id, "cantidad": 2, "precio_venta": 180}]})
+    incremental = resumen_dashboard()
+    assert round(incremental["ganancia_estimada"] - antes["ganancia_estimada"], 2) == 160
+
+    # el envío del lote cambia el costo actual del producto, no el de la venta ya hecha
+    repreciar_lote(producto.lote_id, costo_envio=500)
+    db.session.commit()
+    reconstruir_resumenes()
+    reconstruido = resumen_dashboard()
+    assert reconstruido["total_ventas"] == incremental["total_ventas"]
+    assert reconstruido["ganancia_estimada"] == incremental["ganancia_estimada"]
@@ -0,0 +1,22 @@
+"""Cola de trabajos: purga de los terminados."""
+from datetime import datetime, timedelta
+from sqlalchemy import select
+from models import db, Trabajo
+from jobs import purgar
+
+
+def test_purgar_conserva_pendientes_recientes_y_errores(ctx):
+    viejo = datetime.utcnow() - timedelta(days=30)
+    trabajos = {estado: Trabajo(tipo="purga", estado=estado, actualizado=viejo)
+                for estado in ("hecho", "error", "pendiente", "en_curso")}
+    trabajos["reciente"] = Trabajo(tipo="purga", estado="hecho")
+    db.session.add_all(trabajos.values())
+    db.session.commit()
+
+    def quedan():
+        return set(db.session.scalars(select(Trabajo.id).where(Trabajo.tipo == "purga")))
+
+    assert purgar(7) >= 1
+    assert quedan() == {t.id for k, t in trabajos.items() if k != "hecho"}
+    purgar(7, con_errores=True)
+    assert quedan() == {trabajos[k].id for k in ("pendiente", "en_curso", "reciente")}